@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+transcribe.py の文字起こしをローカルのHTTP APIとして提供するサーバー (aiohttp)
+
+音声ファイルのアップロードまたはファイルパスを受け付けてキューに積み、
+モデルを読み込んだままの Transcriber で順に処理する。ジョブの状態・進捗・確定したセグメントを取得できる。
+"""
+
+import argparse
+import asyncio
+import copy
+import os
+import sys
+import json
+import uuid
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from aiohttp import web
+
+from transcribe import (
+    Config, Transcriber, SegmentRecord, setup_encoding, check_dependencies, check_ffmpeg, probe_duration
+)
+
+logger = logging.getLogger("api_server")
+
+HASH_CHUNK_BYTES = 1 << 20  # ファイルのハッシュ計算・アップロードの保存に使う単位
+
+def file_hash(path: str) -> str:
+    """ファイルの内容のハッシュ（同じ音声の重複リクエストの判定用）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class Job:
+    """1件の文字起こし要求の状態"""
+    
+    def __init__(self, file_path: str, options: Dict, content_hash: str, duration_s: Optional[float] = None):
+        self.id = uuid.uuid4().hex
+        self.file_path = file_path
+        self.options = options
+        self.content_hash = content_hash
+        self.duration_s = duration_s  # 進捗の計算に使う音声の長さ（秒）
+        self.state = "queued"  # queued / running / done / failed
+        self.progress = 0.0
+        self.segments = []
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now().isoformat(timespec='seconds')
+        self.started_at = None
+        self.finished_at = None
+        self.subscribers = []  # セグメントを逐次受け取るストリーミング応答のキュー
+    
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "failed")
+    
+    def to_dict(self) -> Dict:
+        data = {
+            'id': self.id,
+            'file': self.file_path,
+            'options': self.options,
+            'state': self.state,
+            'progress': round(self.progress, 3),
+            'segments': len(self.segments),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error
+        }
+        if self.result:
+            data['result'] = self.result
+        return data
+    
+    def add_segment(self, segment: Dict, progress: Optional[float]):
+        """確定したセグメントを記録し、ストリーミング中の応答に渡す（イベントループのスレッドで呼ぶ）"""
+        self.segments.append(segment)
+        if progress is not None:
+            # 完了するまでは100%にしない
+            self.progress = max(self.progress, min(progress, 0.99))
+        for subscriber in self.subscribers:
+            subscriber.put_nowait(segment)
+    
+    def finish(self, result: Optional[Dict], error: Optional[str]):
+        """ジョブの終了を記録し、ストリーミング中の応答を終わらせる"""
+        self.state = "failed" if error else "done"
+        self.result = result
+        self.error = error
+        if not error:
+            self.progress = 1.0
+        self.finished_at = datetime.now().isoformat(timespec='seconds')
+        for subscriber in self.subscribers:
+            subscriber.put_nowait(None)
+
+class TranscriptionService:
+    """ジョブキューと、モデルを読み込んだ Transcriber を持つワーカーを管理するクラス"""
+    
+    # 状態を問い合わせられるよう保持しておく終了済みジョブの件数
+    max_history = 1000
+    
+    def __init__(self, config: Config, args):
+        self.config = config
+        self.args = args
+        self.jobs = {}
+        self.by_hash = {}  # (内容のハッシュ, オプション) -> ジョブ（重複リクエストをまとめる）
+        self.queue = asyncio.Queue(maxsize=args.max_queue)
+        self.executor = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="transcriber")
+        self.workers = []
+        self.loop = None
+    
+    async def start(self, app: web.Application):
+        """ワーカーごとにモデルを読み込み、キューの処理を開始する"""
+        self.loop = asyncio.get_running_loop()
+        # 前回のサーバーが処理中に終了した場合に残ったアップロードを削除する（ジョブは引き継がれない）
+        if os.path.isdir(self.args.upload_dir):
+            for name in os.listdir(self.args.upload_dir):
+                os.remove(os.path.join(self.args.upload_dir, name))
+        for i in range(self.args.workers):
+            # ジョブごとに設定を切り替えられるよう、ワーカーごとに設定を複製する
+            transcriber = Transcriber(copy.copy(self.config))
+            # モデルは起動時に読み込んでおき、以降の要求で使い回す
+            loaded = await self.loop.run_in_executor(self.executor, transcriber._ensure_model, self.args.model)
+            if not loaded:
+                raise RuntimeError(f"モデル '{self.args.model}' の読み込みに失敗しました")
+            self.workers.append(asyncio.create_task(self._worker(transcriber)))
+        logger.info(f"{self.args.workers} 個のワーカーで要求の受け付けを開始します（キューの上限: {self.args.max_queue}）")
+    
+    async def stop(self, app: web.Application):
+        """ワーカーを停止する"""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+    
+    def submit(self, file_path: str, options: Dict, content_hash: str, duration_s: Optional[float] = None) -> Tuple[Job, bool]:
+        """ジョブを登録する（同じ音声・同じオプションのジョブが失敗していなければそれを返す）"""
+        key = (content_hash, json.dumps(options, sort_keys=True))
+        existing = self.by_hash.get(key)
+        if existing and existing.state != "failed":
+            return existing, True
+        job = Job(file_path, options, content_hash, duration_s)
+        # キューが満杯の場合は呼び出し元で429を返す
+        self.queue.put_nowait(job)
+        self.jobs[job.id] = job
+        self.by_hash[key] = job
+        self._prune()
+        return job, False
+    
+    def is_upload(self, file_path: str) -> bool:
+        """APIにアップロードされた音声かどうかを返す"""
+        return file_path.startswith(self.args.upload_dir + os.sep)
+    
+    def _prune(self):
+        """古い終了済みジョブを破棄する"""
+        finished = [job for job in self.jobs.values() if job.finished]
+        for job in finished[:max(0, len(finished) - self.max_history)]:
+            del self.jobs[job.id]
+            self.by_hash = {key: value for key, value in self.by_hash.items() if value is not job}
+    
+    async def _worker(self, transcriber: Transcriber):
+        """キューからジョブを取り出し、スレッドプールで文字起こしする"""
+        while True:
+            job = await self.queue.get()
+            job.state = "running"
+            job.started_at = datetime.now().isoformat(timespec='seconds')
+            try:
+                result = await self.loop.run_in_executor(self.executor, self._run_job, transcriber, job)
+                job.finish(result, None if result['success'] else result['error'])
+            except Exception as e:
+                logger.error(f"ジョブ {job.id} の処理中にエラーが発生しました: {e}", exc_info=True)
+                job.finish(None, str(e))
+            finally:
+                self.queue.task_done()
+            logger.info(f"ジョブ {job.id} が終了しました: {job.state}")
+            # アップロードされた音声は処理が終われば不要（結果は出力ファイルとジョブに残る）
+            if self.is_upload(job.file_path) and os.path.exists(job.file_path):
+                os.remove(job.file_path)
+    
+    def _run_job(self, transcriber: Transcriber, job: Job) -> Dict:
+        """ワーカースレッドで1件のジョブを処理する"""
+        def on_record(record: SegmentRecord):
+            audio_s = transcriber.run_info.get('audio_s') or job.duration_s
+            progress = record.end / audio_s if audio_s else None
+            segment = record._asdict()
+            self.loop.call_soon_threadsafe(job.add_segment, segment, progress)
+        
+        transcriber.on_record = on_record
+        # アップロードされた音声は毎回別の名前で保存され、同じファイルで再開されることがないため、
+        # チェックポイントを作らない（パス指定のジョブは同じパスで再送すれば続きから再開する）
+        transcriber.config.use_checkpoint = self.config.use_checkpoint and not self.is_upload(job.file_path)
+        # 話者分離なしのジョブは窓ごとに文字起こしし、確定したセグメントを処理中に届ける
+        # （話者分離は音声全体が必要なため、話者分離ありのジョブのセグメントは処理の最後にまとめて届く）
+        transcriber.config.stream = not job.options['diarize']
+        try:
+            return transcriber.process_file(
+                file_path=job.file_path,
+                model_name=self.args.model,
+                language=job.options['language'],
+                diarize=job.options['diarize'],
+                output_dir=self.args.output_dir
+            )
+        finally:
+            transcriber.on_record = None
+
+async def read_submission(request: web.Request, upload_dir: str, max_bytes: int) -> Tuple[str, Dict]:
+    """アップロードされたファイル、またはJSONで指定されたファイルパスとオプションを読み込む"""
+    options = {}
+    if request.content_type.startswith("multipart/"):
+        reader = await request.multipart()
+        file_path = None
+        try:
+            async for part in reader:
+                if part.name == "file" and not file_path:
+                    os.makedirs(upload_dir, exist_ok=True)
+                    extension = os.path.splitext(part.filename or "")[1].lower()
+                    file_path = os.path.join(upload_dir, f"{uuid.uuid4().hex}{extension}")
+                    # multipartの逐次読み込みにはclient_max_sizeが適用されないため、受信した大きさを数えて制限する
+                    received = 0
+                    with open(file_path, 'wb') as f:
+                        while True:
+                            chunk = await part.read_chunk(HASH_CHUNK_BYTES)
+                            if not chunk:
+                                break
+                            received += len(chunk)
+                            if received > max_bytes:
+                                raise web.HTTPRequestEntityTooLarge(max_size=max_bytes, actual_size=received)
+                            f.write(chunk)
+                elif part.name != "file":
+                    options[part.name] = await part.text()
+        except BaseException:
+            # 受信が途中で失敗したアップロードは残さない
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+        if not file_path:
+            raise web.HTTPBadRequest(text="file が指定されていません")
+    else:
+        try:
+            data = await request.json()
+        except json.JSONDecodeError:
+            raise web.HTTPBadRequest(text="JSONまたはmultipartで送信してください")
+        if not isinstance(data, dict):
+            raise web.HTTPBadRequest(text="JSONはオブジェクトで指定してください")
+        file_path = data.get('path')
+        if not isinstance(file_path, str) or not file_path:
+            raise web.HTTPBadRequest(text="path にはファイルパスを文字列で指定してください")
+        if not os.path.isfile(file_path):
+            raise web.HTTPBadRequest(text=f"ファイル '{file_path}' が見つかりません")
+        options = data
+    
+    diarize = options.get('diarize', False)
+    if not isinstance(options.get('language') or "", str):
+        if file_path.startswith(upload_dir + os.sep):
+            os.remove(file_path)
+        raise web.HTTPBadRequest(text="language は文字列で指定してください")
+    return file_path, {
+        'language': options.get('language') or None,
+        'diarize': diarize if isinstance(diarize, bool) else str(diarize).lower() in ("1", "true", "yes")
+    }
+
+def create_app(service: TranscriptionService, args) -> web.Application:
+    """APIのルーティングを設定したアプリケーションを作成する"""
+    routes = web.RouteTableDef()
+    
+    def get_job(request: web.Request) -> Job:
+        job = service.jobs.get(request.match_info['job_id'])
+        if not job:
+            raise web.HTTPNotFound(text="ジョブが見つかりません")
+        return job
+    
+    @routes.post("/jobs")
+    async def submit_job(request: web.Request) -> web.Response:
+        """ジョブを登録する（キューが満杯なら429を返す）"""
+        if service.queue.full():
+            # アップロードを受け取る前に断る
+            raise web.HTTPTooManyRequests(text="キューが満杯です", headers={'Retry-After': str(args.retry_after)})
+        file_path, options = await read_submission(request, args.upload_dir, args.max_upload_mb * 1024 * 1024)
+        try:
+            if options['diarize'] and args.no_diarization:
+                raise web.HTTPBadRequest(text="このサーバーでは話者分離を使用できません")
+            # 文字起こし中のワーカーを待たないよう、ハッシュの計算は既定のスレッドプールで行う
+            loop = asyncio.get_running_loop()
+            content_hash = await loop.run_in_executor(None, file_hash, file_path)
+            duration_s = await loop.run_in_executor(None, probe_duration, file_path)
+            try:
+                job, coalesced = service.submit(file_path, options, content_hash, duration_s)
+            except asyncio.QueueFull:
+                raise web.HTTPTooManyRequests(text="キューが満杯です", headers={'Retry-After': str(args.retry_after)})
+        except BaseException:
+            # ジョブにならなかったアップロードは残さない
+            if service.is_upload(file_path) and os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+        if coalesced and service.is_upload(file_path):
+            os.remove(file_path)
+        return web.json_response(dict(job.to_dict(), coalesced=coalesced), status=200 if coalesced else 202)
+    
+    @routes.get("/jobs/{job_id}")
+    async def job_status(request: web.Request) -> web.Response:
+        """ジョブの状態と進捗を返す"""
+        return web.json_response(get_job(request).to_dict())
+    
+    @routes.get("/jobs/{job_id}/segments")
+    async def job_segments(request: web.Request) -> web.StreamResponse:
+        """確定したセグメントを返す（stream=1の場合はジョブの終了までJSON Linesで逐次送る）"""
+        job = get_job(request)
+        try:
+            start = max(0, int(request.query.get('since', 0)))
+        except ValueError:
+            raise web.HTTPBadRequest(text="since には整数を指定してください")
+        if request.query.get('stream') not in ("1", "true"):
+            return web.json_response({'state': job.state, 'segments': job.segments[start:]})
+        
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson; charset=utf-8'})
+        await response.prepare(request)
+        subscriber = asyncio.Queue()
+        # 送信済みのセグメントと購読開始後のセグメントが重複・欠落しないよう、同じループ内で登録する
+        pending = job.segments[start:]
+        if not job.finished:
+            job.subscribers.append(subscriber)
+        try:
+            for segment in pending:
+                await response.write((json.dumps(segment, ensure_ascii=False) + "\n").encode('utf-8'))
+            while not job.finished or not subscriber.empty():
+                segment = await subscriber.get()
+                if segment is None:
+                    break
+                await response.write((json.dumps(segment, ensure_ascii=False) + "\n").encode('utf-8'))
+        finally:
+            if subscriber in job.subscribers:
+                job.subscribers.remove(subscriber)
+        await response.write_eof()
+        return response
+    
+    @routes.get("/jobs/{job_id}/result")
+    async def job_result(request: web.Request) -> web.StreamResponse:
+        """完了したジョブの出力ファイルを返す"""
+        job = get_job(request)
+        if job.state != "done":
+            raise web.HTTPConflict(text=f"ジョブは完了していません（状態: {job.state}）")
+        return web.FileResponse(job.result['output_file'])
+    
+    @routes.get("/health")
+    async def health(request: web.Request) -> web.Response:
+        """サーバーの状態（キューの長さ・ワーカー数）を返す"""
+        return web.json_response({
+            'model': args.model,
+            'workers': args.workers,
+            'queued': service.queue.qsize(),
+            'max_queue': args.max_queue,
+            'running': sum(1 for job in service.jobs.values() if job.state == "running")
+        })
+    
+    app = web.Application(client_max_size=args.max_upload_mb * 1024 * 1024)
+    app.add_routes(routes)
+    app.on_startup.append(service.start)
+    app.on_cleanup.append(service.stop)
+    return app
+
+def main():
+    """メイン関数"""
+    setup_encoding()
+    config = Config()
+    
+    parser = argparse.ArgumentParser(description='文字起こしのローカルHTTP APIサーバー')
+    parser.add_argument('--host', type=str, default="127.0.0.1", help='待ち受けるアドレス（デフォルト: ローカルのみ）')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--model', type=str, default=config.default_model, choices=config.get_available_models())
+    parser.add_argument('--workers', type=int, default=1, help='同時に処理するジョブ数（ワーカーごとにモデルを読み込む）')
+    parser.add_argument('--max_queue', type=int, default=16, help='待機できるジョブ数の上限（超えると429を返す）')
+    parser.add_argument('--retry_after', type=int, default=30, help='429応答で再送を促す秒数')
+    parser.add_argument('--max_upload_mb', type=int, default=1024, help='アップロードできるファイルの大きさの上限（MB）')
+    parser.add_argument('--diarize_mode', choices=config.diarize_modes, default=config.diarize_mode)
+    parser.add_argument('--output_format', choices=config.output_formats, default=config.output_format)
+    parser.add_argument('--upload_dir', type=str, default="./tmp/api_uploads", help='アップロードされた音声の保存先')
+    parser.add_argument('--output_dir', type=str, default="output", help='文字起こし結果の保存先')
+    parser.add_argument('--no_diarization', action='store_true', help='話者分離を受け付けない（pyannote.audioが不要になる）')
+    args = parser.parse_args()
+    args.upload_dir = os.path.abspath(args.upload_dir)
+    
+    config.diarize_mode = args.diarize_mode
+    config.output_format = args.output_format
+    
+    if not check_dependencies(diarize=not args.no_diarization, cache_file=config.probe_cache_file):
+        logger.error("必要な依存関係が満たされていません")
+        sys.exit(1)
+    if not check_ffmpeg(cache_file=config.probe_cache_file):
+        logger.error("FFmpegが利用できません。インストールまたはパスの設定を確認してください。")
+        sys.exit(1)
+    
+    service = TranscriptionService(config, args)
+    web.run_app(create_app(service, args), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,589 @@
+#!/usr/bin/env python3
+"""
+transcribe.py の処理性能を計測するベンチマークスクリプト
+"""
+
+import argparse
+import os
+import sys
+import time
+import statistics
+import subprocess
+import logging
+import json
+import re
+import wave
+import platform
+import importlib.util
+import multiprocessing
+from collections import namedtuple
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from transcribe import Config, Transcriber, StageProfiler, setup_encoding, peak_rss_mb, configure_torch_threads, SAMPLE_RATE
+
+logger = logging.getLogger("benchmark")
+
+def make_fixed_turns(duration_s: float, turn_s: float, speakers: int = 2) -> List[Dict]:
+    """一定長で交互に話者が替わる話者区間を生成する（話者分離モデルなしで計測するため）"""
+    turns = []
+    start_ms = 0
+    index = 0
+    while start_ms < duration_s * 1000:
+        end_ms = min(int(start_ms + turn_s * 1000), int(duration_s * 1000))
+        turns.append({'start': start_ms, 'end': end_ms, 'speaker': f"SPEAKER_{index % speakers:02d}"})
+        start_ms = end_ms
+        index += 1
+    return turns
+
+def bench_segments(args) -> int:
+    """segment方式の逐次処理とバッチ処理のスループットを比較する"""
+    config = Config()
+    transcriber = Transcriber(config)
+    processor = transcriber.audio_processor
+    
+    if not processor.load_model(args.model):
+        return 1
+    audio = processor.decode_audio(args.file)
+    duration_s = len(audio) / SAMPLE_RATE
+    
+    if args.diarize:
+        turns = processor.diarize_speakers(audio)
+    else:
+        turns = make_fixed_turns(duration_s, args.turn_seconds)
+    if not turns:
+        logger.error("話者区間がありません")
+        return 1
+    
+    # 区間の整理・まとめの影響を除いて比較できるよう、既定では区間ごとに文字起こしする
+    config.pack_seconds = args.pack_seconds
+    print(f"音声長: {duration_s:.1f}秒, 区間数: {len(turns)}, モデル: {args.model}")
+    print(f"{'batch_size':>10} {'時間(秒)':>10} {'区間/秒':>10} {'実時間比':>10} {'呼び出し':>8}")
+    for batch_size in args.batch_sizes:
+        config.batch_size = batch_size
+        start = time.perf_counter()
+        results = transcriber.transcribe_turns(audio, args.language, turns)
+        elapsed = time.perf_counter() - start
+        calls = transcriber.run_info.get('segment_plan', {}).get('calls', len(turns))
+        print(f"{batch_size:>10} {elapsed:>10.2f} {len(turns) / elapsed:>10.2f} {duration_s / elapsed:>10.2f}"
+              f" {calls:>8}  ({len(results)} 発話)")
+    return 0
+
+# 最初の処理（音声のデコード）の開始を示すログ
+FIRST_WORK_MARKER = "のデコードを開始します"
+
+def measure_startup(command: List[str], marker: Optional[str]) -> float:
+    """コマンドを起動し、markerを含む行がログに出るまで（marker未指定なら終了まで）の時間を計測する"""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        env=dict(os.environ, PYTHONUTF8="1")
+    )
+    try:
+        if marker is None:
+            process.wait()
+            return time.perf_counter() - start
+        for line in process.stderr:
+            if marker in line.decode('utf-8', errors='ignore'):
+                return time.perf_counter() - start
+        raise RuntimeError(f"ログに '{marker}' が出力されないまま終了しました: {' '.join(command)}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+def bench_startup(args) -> int:
+    """--help と各モードの最初の処理開始までの時間を計測する"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "transcribe.py")
+    base = [sys.executable, script]
+    cases = [("help", base + ["--help"], None)]
+    if args.file:
+        common = [args.file, "--model", args.model, "--no_checkpoint", "--output_dir", args.output_dir]
+        cases.append(("plain", base + common, FIRST_WORK_MARKER))
+        cases.append(("diarize", base + common + ["--diarize"], FIRST_WORK_MARKER))
+        cases.append(("stream", base + common + ["--stream"], FIRST_WORK_MARKER))
+    
+    print(f"{'モード':<10} {'中央値(秒)':>12} {'最小(秒)':>10}")
+    for name, command, marker in cases:
+        try:
+            times = [measure_startup(command, marker) for _ in range(args.repeat)]
+        except Exception as e:
+            logger.error(f"{name} の計測に失敗しました: {e}")
+            return 1
+        print(f"{name:<10} {statistics.median(times):>12.3f} {min(times):>10.3f}")
+    return 0
+
+# 合成音声の話者ごとの基本周波数（スタブの話者分離はこの周波数で話者を判別する）
+SPEAKER_PITCH_HZ = [110, 170, 240, 320, 410, 510]
+
+def synthesize_meeting(path: str, duration_s: float, turns: int, speakers: int, seed: int = 0) -> List[Dict]:
+    """話者ごとに高さの異なる合成音声で会議音声を生成してWAVに保存し、正解の話者区間を返す"""
+    rng = np.random.default_rng(seed)
+    weights = rng.uniform(0.5, 1.5, turns)
+    lengths = weights / weights.sum() * duration_s
+    
+    truth = []
+    position = 0
+    previous = None
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        # 区間ごとに生成して書き出すため、長時間の音声でも全体をメモリに保持しない
+        for length in lengths:
+            speaker = int(rng.integers(speakers))
+            if speakers > 1 and speaker == previous:
+                speaker = (speaker + 1) % speakers
+            previous = speaker
+            
+            n = int(length * SAMPLE_RATE)
+            gap = min(int(rng.uniform(0.2, 0.8) * SAMPLE_RATE), n // 4)
+            t = np.arange(n - gap) / SAMPLE_RATE
+            pitch = SPEAKER_PITCH_HZ[speaker]
+            voice = sum(amplitude * np.sin(2 * np.pi * pitch * k * t) for k, amplitude in ((1, 1.0), (2, 0.5), (3, 0.25)))
+            # 音節のような振幅の揺らぎを付ける
+            envelope = 0.6 + 0.4 * np.sin(2 * np.pi * rng.uniform(3, 5) * t + rng.uniform(0, np.pi))
+            signal = rng.normal(0, 1e-3, n)
+            signal[:n - gap] += 0.2 * voice * envelope
+            wav.writeframes((np.clip(signal, -1, 1) * 32767).astype('<i2').tobytes())
+            
+            truth.append({
+                'start': int(position * 1000 / SAMPLE_RATE),
+                'end': int((position + n - gap) * 1000 / SAMPLE_RATE),
+                'speaker': f"SPEAKER_{speaker:02d}"
+            })
+            position += n
+    return truth
+
+def prepare_synthetic_audio(output_dir: str, duration_s: float, turns: int, speakers: int, seed: int) -> str:
+    """合成音声を生成する（同じ条件のファイルがあれば再利用する）"""
+    os.makedirs(output_dir, exist_ok=True)
+    name = f"synth_{int(duration_s)}s_{turns}turns_{speakers}spk_seed{seed}"
+    path = os.path.join(output_dir, f"{name}.wav")
+    if not os.path.exists(path):
+        logger.info(f"合成音声 {path} を生成します（{duration_s:.0f}秒, {turns}区間, {speakers}話者）")
+        truth = synthesize_meeting(path, duration_s, turns, speakers, seed)
+        with open(os.path.join(output_dir, f"{name}.turns.json"), 'w', encoding='utf-8') as f:
+            json.dump(truth, f, ensure_ascii=False, indent=2)
+    return path
+
+class StubWhisperModel:
+    """ネットワークや重みファイルなしで動くWhisperの代替（音声を一定長のセグメントに区切るだけ）"""
+    
+    segment_s = 5.0
+    
+    def transcribe(self, audio, language=None, initial_prompt=None, word_timestamps=False, **kwargs) -> Dict:
+        audio = np.asarray(audio, dtype=np.float32)
+        duration_s = len(audio) / SAMPLE_RATE
+        segments = []
+        start = 0.0
+        while start < duration_s:
+            end = min(duration_s, start + self.segment_s)
+            piece = audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+            # ほぼ無音のセグメントは出力しない
+            if len(piece) and float(np.sqrt(np.mean(piece ** 2))) >= 1e-2:
+                text = f"発話{len(segments) + 1}。"
+                segment = {'start': start, 'end': end, 'text': text, 'avg_logprob': -0.2, 'no_speech_prob': 0.01}
+                if word_timestamps:
+                    segment['words'] = [{'start': start, 'end': end, 'word': text}]
+                segments.append(segment)
+            start = end
+        return {
+            'text': "".join(segment['text'] for segment in segments),
+            'segments': segments,
+            'language': language or "ja"
+        }
+
+StubSegment = namedtuple("StubSegment", ["start", "end"])
+
+class StubAnnotation:
+    """pyannoteの話者分離結果（Annotation）のうち、itertracksだけを持つ代替"""
+    
+    def __init__(self, tracks: List[Tuple[float, float, str]]):
+        self.tracks = tracks
+    
+    def labels(self) -> List[str]:
+        return sorted({speaker for _, _, speaker in self.tracks})
+    
+    def itertracks(self, yield_label: bool = False):
+        for i, (start, end, speaker) in enumerate(self.tracks):
+            if yield_label:
+                yield StubSegment(start, end), i, speaker
+            else:
+                yield StubSegment(start, end), i
+
+class StubDiarizationPipeline:
+    """合成音声の基本周波数から話者を判別するpyannoteパイプラインの代替"""
+    
+    frame_s = 0.5
+    
+    def __call__(self, inputs: Dict, return_embeddings: bool = False):
+        waveform = inputs['waveform']
+        audio = np.asarray(waveform.numpy() if hasattr(waveform, 'numpy') else waveform, dtype=np.float32).reshape(-1)
+        hop = int(self.frame_s * inputs['sample_rate'])
+        n_frames = len(audio) // hop
+        frames = audio[:n_frames * hop].reshape(n_frames, hop)
+        
+        rms = np.sqrt(np.mean(frames ** 2, axis=1))
+        spectrum = np.abs(np.fft.rfft(frames * np.hanning(hop), axis=1))
+        peak_hz = np.argmax(spectrum, axis=1) * inputs['sample_rate'] / hop
+        pitches = np.array(SPEAKER_PITCH_HZ)
+        labels = np.argmin(np.abs(peak_hz[:, None] - pitches[None, :]), axis=1)
+        
+        tracks = []
+        for i in range(n_frames):
+            if rms[i] < 1e-2:
+                continue
+            speaker = f"SPEAKER_{labels[i]:02d}"
+            start, end = i * self.frame_s, (i + 1) * self.frame_s
+            if tracks and tracks[-1][2] == speaker and tracks[-1][1] == start:
+                tracks[-1] = (tracks[-1][0], end, speaker)
+            else:
+                tracks.append((start, end, speaker))
+        annotation = StubAnnotation(tracks)
+        if not return_embeddings:
+            return annotation
+        # 話者の基本周波数ごとの成分を埋め込みの代わりにする
+        embeddings = np.eye(len(SPEAKER_PITCH_HZ), dtype=np.float32)[
+            [int(label.rsplit("_", 1)[1]) for label in annotation.labels()]
+        ]
+        return annotation, embeddings
+
+def real_weights_available(model_name: str, config_file: str) -> Dict[str, bool]:
+    """ローカルにWhisper・話者分離の実モデルがあるかを確認する（ダウンロードは行わない）"""
+    whisper_root = os.path.join(os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")), "whisper")
+    return {
+        'whisper': (
+            importlib.util.find_spec("whisper") is not None
+            and os.path.exists(os.path.join(whisper_root, f"{model_name}.pt"))
+        ),
+        'diarization': importlib.util.find_spec("pyannote") is not None and os.path.exists(config_file)
+    }
+
+def run_case(case: Dict) -> Dict:
+    """1つのモードを計測する（メモリ使用量を分けて測るため、モードごとに別プロセスで実行される）"""
+    # 計測結果の表が埋もれないよう、transcribe.pyの進捗ログは警告以上だけを表示する
+    logging.getLogger("transcribe").setLevel(logging.WARNING)
+    config = Config()
+    config.use_cache = False
+    config.use_checkpoint = False
+    config.stream = case['stream']
+    config.batch_size = case['batch_size']
+    transcriber = Transcriber(config)
+    processor = transcriber.audio_processor
+    if case['whisper'] == "stub":
+        processor.model = StubWhisperModel()
+        processor.model_name = case['model']
+    if case['diarization'] == "stub":
+        processor.pipeline = StubDiarizationPipeline()
+    
+    output_dir = os.path.join(case['output_dir'], "outputs")
+    times = []
+    stages = {}
+    result = {}
+    for _ in range(case['repeat']):
+        result = transcriber.process_file(
+            case['file'], case['model'], case['language'], case['diarize'], output_dir=output_dir
+        )
+        if not result['success']:
+            raise RuntimeError(result.get('error') or f"{case['name']} の処理に失敗しました")
+        times.append(result['elapsed_s'])
+        stages = transcriber.profiler.report(result.get('audio_s'))['summary']
+    
+    audio_s = result.get('audio_s') or 0.0
+    median_s = statistics.median(times)
+    return {
+        'audio_s': audio_s,
+        'first_s': times[0],
+        'median_s': round(median_s, 4),
+        'min_s': round(min(times), 4),
+        'audio_s_per_s': round(audio_s / median_s, 3) if median_s > 0 else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': {name: total['wall_s'] for name, total in stages.items()}
+    }
+
+def run_in_subprocess(func, case: Dict) -> Dict:
+    """計測を別プロセスで実行する（最大メモリ量やスレッド設定が他の計測に影響しないようにする）"""
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(func, (case,))
+
+# ベースラインとの比較に使う指標と、値が大きいほど良いかどうか
+BASELINE_METRICS = {'median_s': False, 'audio_s_per_s': True, 'peak_rss_mb': False}
+
+def compare_with_baseline(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """ベースラインとの差分を表示し、許容範囲を超えて悪化した指標の一覧を返す"""
+    regressions = []
+    print(f"\n{'モード':<10} {'指標':<14} {'ベースライン':>12} {'今回':>12} {'変化':>9}")
+    for name, metrics in results.items():
+        previous = baseline.get('cases', {}).get(name)
+        if not previous:
+            print(f"{name:<10} （ベースラインなし）")
+            continue
+        for metric, higher_is_better in BASELINE_METRICS.items():
+            old, new = previous.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            mark = "  悪化" if worse > tolerance else ""
+            if mark:
+                regressions.append(f"{name}.{metric}")
+            print(f"{name:<10} {metric:<14} {old:>12.3f} {new:>12.3f} {change:>+8.1%}{mark}")
+    return regressions
+
+def bench_suite(args) -> int:
+    """合成音声で通常・話者分離・長時間の各モードを計測し、ベースラインと比較する"""
+    config = Config()
+    available = real_weights_available(args.model, config.config_file)
+    if args.models == "auto":
+        backends = {name: "real" if found else "stub" for name, found in available.items()}
+    else:
+        backends = {'whisper': args.models, 'diarization': args.models}
+    if "real" in backends.values() and args.models == "real" and not all(available.values()):
+        logger.warning("ローカルに見つからない実モデルがあります。読み込み時にダウンロードが発生する可能性があります")
+    
+    turns_per_s = args.turns / args.duration
+    files = {
+        'normal': prepare_synthetic_audio(args.output_dir, args.duration, args.turns, args.speakers, args.seed),
+        'long': prepare_synthetic_audio(
+            args.output_dir, args.long_duration, max(1, round(args.long_duration * turns_per_s)), args.speakers, args.seed
+        )
+    }
+    # 実モデルでなければ区間ごとのバッチデコードは使えないため逐次処理にする
+    batch_size = args.batch_size if backends['whisper'] == "real" else 1
+    case_specs = {
+        'plain': {'file': files['normal'], 'diarize': False, 'stream': False},
+        'diarized': {'file': files['normal'], 'diarize': True, 'stream': False},
+        'long': {'file': files['long'], 'diarize': False, 'stream': True}
+    }
+    
+    print(f"Whisper: {backends['whisper']}, 話者分離: {backends['diarization']}, モデル: {args.model}, 繰り返し: {args.repeat}")
+    print(f"{'モード':<10} {'音声(秒)':>9} {'初回(秒)':>9} {'中央値(秒)':>11} {'実時間比':>9} {'最大メモリ(MB)':>15}")
+    results = {}
+    for name in args.modes:
+        case = dict(
+            case_specs[name], name=name, model=args.model, language=args.language, repeat=args.repeat,
+            batch_size=batch_size, output_dir=args.output_dir, **backends
+        )
+        try:
+            metrics = run_in_subprocess(run_case, case)
+        except Exception as e:
+            logger.error(f"{name} の計測に失敗しました: {e}")
+            return 1
+        results[name] = metrics
+        print(f"{name:<10} {metrics['audio_s']:>9.1f} {metrics['first_s']:>9.3f} {metrics['median_s']:>11.3f} "
+              f"{metrics['audio_s_per_s'] or 0:>9.1f} {metrics['peak_rss_mb'] or 0:>15.1f}")
+    
+    report = {
+        'meta': {
+            'whisper': backends['whisper'],
+            'diarization': backends['diarization'],
+            'model': args.model,
+            'duration_s': args.duration,
+            'long_duration_s': args.long_duration,
+            'turns': args.turns,
+            'speakers': args.speakers,
+            'seed': args.seed,
+            'python': platform.python_version(),
+            'platform': platform.platform()
+        },
+        'cases': results
+    }
+    if args.result_file:
+        with open(args.result_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    
+    status = 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        changed = [key for key in ('whisper', 'diarization', 'model', 'duration_s', 'long_duration_s', 'turns', 'speakers', 'seed')
+                   if baseline.get('meta', {}).get(key) != report['meta'][key]]
+        if changed:
+            logger.warning(f"ベースラインと計測条件が異なります: {', '.join(changed)}")
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n許容範囲（{args.tolerance:.0%}）を超えて悪化した指標: {', '.join(regressions)}")
+            status = 1 if args.fail_on_regression else 0
+    elif not args.save_baseline:
+        print(f"\nベースライン {args.baseline} がありません。--save_baseline で今回の結果を保存できます")
+    
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"ベースラインを {args.baseline} に保存しました")
+    return status
+
+def normalize_for_cer(text: str) -> str:
+    """文字誤り率の計算用に空白と句読点を除く"""
+    return re.sub(r"[\s、。，．,.!?！？「」『』（）()\"'・…ー-]", "", text)
+
+def character_error_rate(reference: str, hypothesis: str) -> float:
+    """文字単位の編集距離を参照テキストの文字数で割った誤り率を返す"""
+    reference = normalize_for_cer(reference)
+    hypothesis = normalize_for_cer(hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_char in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_char in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_char != hyp_char)))
+        previous = current
+    return previous[-1] / len(reference)
+
+def run_inference_case(case: Dict) -> Dict:
+    """1つの推論設定（float32またはint8）でモデルの読み込みと文字起こしの時間を計測する"""
+    logging.getLogger("transcribe").setLevel(logging.WARNING)
+    config = Config()
+    config.use_cache = False
+    config.use_checkpoint = False
+    config.quantize = case['quantize']
+    configure_torch_threads(case['threads'], case['interop_threads'])
+    transcriber = Transcriber(config)
+    
+    start = time.perf_counter()
+    if not transcriber._ensure_model(case['model']):
+        raise RuntimeError(f"モデル '{case['model']}' の読み込みに失敗しました")
+    load_s = time.perf_counter() - start
+    
+    times = []
+    text = ""
+    for _ in range(case['repeat']):
+        transcriber.profiler = StageProfiler()
+        text = transcriber.transcribe_audio(case['file'], case['model'], case['language'])
+        if not text:
+            raise RuntimeError("文字起こし結果が空です")
+        times.append(transcriber.profiler.report()['summary']['transcription']['wall_s'])
+    
+    audio_s = transcriber.run_info['audio_s']
+    median_s = statistics.median(times)
+    return {
+        'load_s': round(load_s, 3),
+        'median_s': round(median_s, 3),
+        'audio_s_per_s': round(audio_s / median_s, 3) if median_s > 0 else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'text': text
+    }
+
+def bench_quantize(args) -> int:
+    """float32とint8量子化のモデルで読み込み時間・推論速度・メモリ量・文字誤り率を比較する"""
+    config = Config()
+    cache_file = os.path.join(config.quantized_dir, f"{args.model}.int8.pt")
+    variants = [('float32', False), ('int8', True)]
+    if not os.path.exists(cache_file):
+        # 初回は量子化と保存の時間を含むため、保存済みモデルからの読み込みも計測する
+        variants.append(('int8(保存済み)', True))
+    
+    reference = None
+    if args.reference:
+        with open(args.reference, 'r', encoding='utf-8') as f:
+            reference = f.read()
+    
+    print(f"ファイル: {args.file}, モデル: {args.model}, スレッド数: {args.threads or '既定'}, 繰り返し: {args.repeat}")
+    print(f"{'設定':<16} {'読込(秒)':>9} {'推論(秒)':>9} {'実時間比':>9} {'速度比':>7} {'最大メモリ(MB)':>15} {'CER':>7}")
+    results = {}
+    for name, quantize in variants:
+        case = {
+            'file': args.file, 'model': args.model, 'language': args.language, 'quantize': quantize,
+            'threads': args.threads, 'interop_threads': args.interop_threads, 'repeat': args.repeat
+        }
+        try:
+            metrics = run_in_subprocess(run_inference_case, case)
+        except Exception as e:
+            logger.error(f"{name} の計測に失敗しました: {e}")
+            return 1
+        # 参照テキストがなければfloat32の結果を基準にする
+        baseline_text = reference if reference is not None else results.get('float32', metrics)['text']
+        metrics['cer'] = round(character_error_rate(baseline_text, metrics['text']), 4)
+        float_s = results.get('float32', metrics)['median_s']
+        metrics['speedup'] = round(float_s / metrics['median_s'], 2) if metrics['median_s'] > 0 else None
+        results[name] = metrics
+        print(f"{name:<16} {metrics['load_s']:>9.2f} {metrics['median_s']:>9.2f} {metrics['audio_s_per_s'] or 0:>9.2f} "
+              f"{metrics['speedup'] or 0:>7.2f} {metrics['peak_rss_mb'] or 0:>15.1f} {metrics['cer']:>7.2%}")
+    if reference is None:
+        print("CERはfloat32の文字起こし結果を基準にした値です（--reference で正解テキストを指定できます）")
+    
+    if args.result_file:
+        with open(args.result_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+def main():
+    """メイン関数"""
+    setup_encoding()
+    
+    parser = argparse.ArgumentParser(description='transcribe.py のベンチマーク')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    segments_parser = subparsers.add_parser('segments', help='segment方式の逐次処理とバッチ処理を比較する')
+    segments_parser.add_argument('file', type=str, help='計測に使う音声ファイルのパス')
+    segments_parser.add_argument('--model', type=str, default=Config().default_model)
+    segments_parser.add_argument('--language', type=str, default=None)
+    segments_parser.add_argument('--diarize', action='store_true', help='固定長区間の代わりに話者分離の結果を使う')
+    segments_parser.add_argument('--turn_seconds', type=float, default=4.0, help='固定長区間の長さ（秒）')
+    segments_parser.add_argument(
+        '--batch_sizes',
+        type=int,
+        nargs='+',
+        default=[1, 4, 8, 16],
+        help='比較するバッチサイズ（1は逐次処理）'
+    )
+    segments_parser.add_argument(
+        '--pack_seconds',
+        type=float,
+        default=0.0,
+        help='話者区間をまとめる窓の最大長（秒）。0で区間ごとに文字起こしする (デフォルト: 0)'
+    )
+    segments_parser.set_defaults(func=bench_segments)
+    
+    startup_parser = subparsers.add_parser('startup', help='起動から最初の処理開始までの時間を計測する')
+    startup_parser.add_argument('file', type=str, nargs='?', default=None, help='計測に使う音声ファイルのパス（省略時は --help のみ）')
+    startup_parser.add_argument('--model', type=str, default=Config().default_model)
+    startup_parser.add_argument('--output_dir', type=str, default="./tmp/benchmark_output")
+    startup_parser.add_argument('--repeat', type=int, default=5, help='計測回数')
+    startup_parser.set_defaults(func=bench_startup)
+    
+    suite_parser = subparsers.add_parser('suite', help='合成音声で通常・話者分離・長時間の各モードを計測する')
+    suite_parser.add_argument(
+        '--models',
+        choices=['auto', 'stub', 'real'],
+        default='auto',
+        help='使用するモデル。autoはローカルに重みがあれば実モデル、なければスタブを使う (デフォルト: auto)'
+    )
+    suite_parser.add_argument('--model', type=str, default=Config().default_model)
+    suite_parser.add_argument('--language', type=str, default="ja")
+    suite_parser.add_argument('--modes', nargs='+', choices=['plain', 'diarized', 'long'], default=['plain', 'diarized', 'long'])
+    suite_parser.add_argument('--duration', type=float, default=120.0, help='合成音声の長さ（秒）')
+    suite_parser.add_argument('--long_duration', type=float, default=1800.0, help='長時間モードの合成音声の長さ（秒）')
+    suite_parser.add_argument('--turns', type=int, default=24, help='合成音声の発話区間数')
+    suite_parser.add_argument('--speakers', type=int, choices=range(1, len(SPEAKER_PITCH_HZ) + 1), default=3, help='合成音声の話者数')
+    suite_parser.add_argument('--seed', type=int, default=0, help='合成音声の乱数シード')
+    suite_parser.add_argument('--batch_size', type=int, default=Config().batch_size, help='実モデル使用時のsegment方式のバッチサイズ')
+    suite_parser.add_argument('--repeat', type=int, default=3, help='モードごとの計測回数')
+    suite_parser.add_argument('--output_dir', type=str, default="./tmp/benchmark")
+    suite_parser.add_argument('--baseline', type=str, default="./tmp/benchmark/baseline.json", help='比較するベースラインのJSONファイル')
+    suite_parser.add_argument('--save_baseline', action='store_true', help='今回の結果をベースラインとして保存する')
+    suite_parser.add_argument('--tolerance', type=float, default=0.1, help='悪化とみなす変化率 (デフォルト: 0.1)')
+    suite_parser.add_argument('--fail_on_regression', action='store_true', help='悪化した指標があれば終了コード1で終了する')
+    suite_parser.add_argument('--result_file', type=str, default=None, help='計測結果を保存するJSONファイル')
+    suite_parser.set_defaults(func=bench_suite)
+    
+    quantize_parser = subparsers.add_parser('quantize', help='float32とint8量子化のモデルで速度と精度を比較する')
+    quantize_parser.add_argument('file', type=str, help='計測に使う音声ファイルのパス')
+    quantize_parser.add_argument('--model', type=str, default=Config().default_model)
+    quantize_parser.add_argument('--language', type=str, default="ja")
+    quantize_parser.add_argument('--reference', type=str, default=None, help='文字誤り率の計算に使う正解テキストのファイル')
+    quantize_parser.add_argument('--threads', type=int, default=None, help='torchの演算スレッド数（intra-op）')
+    quantize_parser.add_argument('--interop_threads', type=int, default=None, help='torchの演算間の並列数（inter-op）')
+    quantize_parser.add_argument('--repeat', type=int, default=3, help='計測回数')
+    quantize_parser.add_argument('--result_file', type=str, default=None, help='計測結果を保存するJSONファイル')
+    quantize_parser.set_defaults(func=bench_quantize)
+    
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+if __name__ == "__main__":
+    main()
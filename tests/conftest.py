@@ -0,0 +1,5 @@
+import os
+import sys
+
+# リポジトリ直下のスクリプト（transcribe.pyなど）をテストから読み込めるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,104 @@
+"""セグメントの出力形式と、タイムスタンプ付きトークン列の変換のテスト"""
+import json
+
+import pytest
+
+from transcribe import SegmentRecord, format_timestamp, open_segment_writer, segments_from_tokens
+
+
+def write_records(path, output_format, records, append=False, start_index=1):
+    with open_segment_writer(str(path), output_format, append, start_index) as writer:
+        for record in records:
+            writer.write(record)
+    return path.read_text(encoding='utf-8')
+
+
+RECORDS = [
+    SegmentRecord(1.0, 2.5, "A", "こんにちは", 0.9),
+    SegmentRecord(3725.5, 3726.0, None, "はい"),
+]
+
+
+def test_format_timestamp():
+    assert format_timestamp(3725.5) == "01:02:05.500"
+    assert format_timestamp(1.0004, ",") == "00:00:01,000"
+    assert format_timestamp(-1.0) == "00:00:00.000"
+
+
+def test_text_writer(tmp_path):
+    assert write_records(tmp_path / "out.txt", "txt", RECORDS) == (
+        "話者 A [1.00s - 2.50s]: こんにちは\n"
+        "はい\n"
+    )
+
+
+def test_jsonl_writer(tmp_path):
+    lines = write_records(tmp_path / "out.jsonl", "jsonl", [SegmentRecord(1.23456, 2.0, "A", "x", 0.5)]).splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {'start': 1.235, 'end': 2.0, 'speaker': "A", 'text': "x", 'confidence': 0.5}
+    ]
+
+
+def test_srt_writer_numbers_cues(tmp_path):
+    assert write_records(tmp_path / "out.srt", "srt", RECORDS) == (
+        "1\n00:00:01,000 --> 00:00:02,500\nA: こんにちは\n\n"
+        "2\n01:02:05,500 --> 01:02:06,000\nはい\n\n"
+    )
+
+
+def test_srt_writer_continues_numbering_on_append(tmp_path):
+    path = tmp_path / "out.srt"
+    write_records(path, "srt", RECORDS[:1])
+    assert write_records(path, "srt", RECORDS[1:], append=True, start_index=2) == (
+        "1\n00:00:01,000 --> 00:00:02,500\nA: こんにちは\n\n"
+        "2\n01:02:05,500 --> 01:02:06,000\nはい\n\n"
+    )
+
+
+def test_vtt_writer_writes_header_once(tmp_path):
+    path = tmp_path / "out.vtt"
+    write_records(path, "vtt", RECORDS[:1])
+    text = write_records(path, "vtt", RECORDS[1:], append=True)
+    assert text == (
+        "WEBVTT\n\n"
+        "00:00:01.000 --> 00:00:02.500\n<v A>こんにちは\n\n"
+        "01:02:05.500 --> 01:02:06.000\nはい\n\n"
+    )
+
+
+def test_vtt_writer_header_when_appending_to_empty_file(tmp_path):
+    path = tmp_path / "out.vtt"
+    path.write_text("", encoding='utf-8')
+    assert write_records(path, "vtt", [], append=True) == "WEBVTT\n\n"
+
+
+class TestSegmentsFromTokens:
+    timestamp_begin = 100
+    
+    @staticmethod
+    def decode(tokens):
+        return "".join(" " if token == 99 else chr(ord('a') + token) for token in tokens)
+    
+    def convert(self, tokens, duration_s=10.0, **kwargs):
+        segments = segments_from_tokens(tokens, self.timestamp_begin, self.decode, duration_s, **kwargs)
+        return [(s['start'], s['end'], s['text']) for s in segments]
+    
+    def test_timestamp_pairs(self):
+        tokens = [100, 0, 1, 150, 150, 2, 200]
+        assert self.convert(tokens) == [(0.0, pytest.approx(1.0), "ab"), (pytest.approx(1.0), pytest.approx(2.0), "c")]
+    
+    def test_trailing_text_ends_at_duration(self):
+        assert self.convert([100, 0, 125, 1], duration_s=3.0) == [(0.0, pytest.approx(0.5), "a"), (pytest.approx(0.5), 3.0, "b")]
+    
+    def test_text_without_timestamps(self):
+        assert self.convert([0, 1], duration_s=2.0) == [(0.0, 2.0, "ab")]
+    
+    def test_blank_segments_are_skipped(self):
+        assert self.convert([100, 99, 150, 150, 0, 200]) == [(pytest.approx(1.0), pytest.approx(2.0), "a")]
+    
+    def test_times_are_clamped_to_duration(self):
+        assert self.convert([100, 0, 2000], duration_s=5.0) == [(0.0, 5.0, "a")]
+    
+    def test_avg_logprob_is_kept(self):
+        segments = segments_from_tokens([100, 0, 150], self.timestamp_begin, self.decode, 5.0, avg_logprob=-0.3)
+        assert segments[0]['avg_logprob'] == -0.3
@@ -0,0 +1,218 @@
+"""話者区間の整理・話者の割り当て・話者の索引のテスト"""
+import json
+
+import numpy as np
+import pytest
+
+from transcribe import (
+    SpeakerAssigner,
+    SpeakerIndex,
+    TurnIndex,
+    assign_speakers,
+    is_multi_speaker,
+    plan_segments,
+    resolve_overlapping_turns,
+)
+
+
+def turn(start: float, end: float, speaker: str) -> dict:
+    return {'start': start, 'end': end, 'speaker': speaker}
+
+
+class TestResolveOverlappingTurns:
+    def test_interrupting_speaker_takes_overlap(self):
+        resolved = resolve_overlapping_turns([turn(0, 5000, 'A'), turn(3000, 4000, 'B')])
+        assert resolved == [turn(0, 3000, 'A'), turn(3000, 4000, 'B'), turn(4000, 5000, 'A')]
+    
+    def test_adjacent_turns_of_same_speaker_are_joined(self):
+        assert resolve_overlapping_turns([turn(0, 1000, 'A'), turn(1000, 2000, 'A')]) == [turn(0, 2000, 'A')]
+    
+    def test_gaps_and_empty_turns(self):
+        resolved = resolve_overlapping_turns([turn(2000, 3000, 'B'), turn(0, 1000, 'A'), turn(1500, 1500, 'C')])
+        assert resolved == [turn(0, 1000, 'A'), turn(2000, 3000, 'B')]
+    
+    def test_input_is_not_modified(self):
+        turns = [turn(0, 5000, 'A'), turn(3000, 4000, 'B')]
+        resolve_overlapping_turns(turns)
+        assert turns == [turn(0, 5000, 'A'), turn(3000, 4000, 'B')]
+
+
+class TestPlanSegments:
+    def test_same_speaker_turns_are_merged(self):
+        windows = plan_segments([turn(0, 1000, 'A'), turn(1500, 2500, 'A')], merge_gap_s=1.0, pack_seconds=0)
+        assert [(w['start'], w['end']) for w in windows] == [(0, 2500)]
+        assert windows[0]['turns'] == [turn(0, 2500, 'A')]
+    
+    def test_merged_turns_fit_whisper_window(self):
+        # 0.5秒間隔で続く4.5秒の発話20件は、30秒以内の窓に分けてまとめる
+        turns = [turn(i * 5000, i * 5000 + 4500, 'A') for i in range(20)]
+        windows = plan_segments(turns, pack_seconds=30)
+        assert [(w['start'], w['end']) for w in windows] == [
+            (0, 29500), (30000, 59500), (60000, 89500), (90000, 99500)
+        ]
+    
+    def test_pack_seconds_above_whisper_window_is_capped(self):
+        turns = [turn(i * 5000, i * 5000 + 4500, 'A') for i in range(20)]
+        assert all(w['end'] - w['start'] <= 30000 for w in plan_segments(turns, pack_seconds=120))
+    
+    def test_speakers_are_packed_together_by_default(self):
+        turns = [turn(0, 2000, 'A'), turn(2500, 4000, 'B'), turn(4500, 6000, 'A')]
+        windows = plan_segments(turns, pack_seconds=30)
+        assert len(windows) == 1
+        assert windows[0]['turns'] == turns
+        assert is_multi_speaker(windows[0])
+    
+    def test_without_mixing_speakers(self):
+        turns = [turn(0, 2000, 'A'), turn(2500, 4000, 'B'), turn(4500, 6000, 'A')]
+        windows = plan_segments(turns, pack_seconds=30, mix_speakers=False)
+        assert [w['turns'] for w in windows] == [[t] for t in turns]
+        assert not any(is_multi_speaker(w) for w in windows)
+    
+    def test_long_pause_starts_new_window(self):
+        windows = plan_segments([turn(0, 1000, 'A'), turn(5000, 6000, 'B')], pack_seconds=30, pack_gap_s=2.0)
+        assert len(windows) == 2
+    
+    def test_overlaps_are_resolved_and_short_windows_dropped(self):
+        windows = plan_segments(
+            [turn(0, 5000, 'A'), turn(3000, 4000, 'B'), turn(10000, 10050, 'C')],
+            pack_seconds=0,
+            min_turn_s=0.1
+        )
+        assert [w['turns'][0]['speaker'] for w in windows] == ['A', 'B', 'A']
+
+
+class TestTurnIndex:
+    turns = [turn(0, 1000, 'A'), turn(500, 3000, 'B'), turn(5000, 6000, 'C')]
+    
+    def test_overlaps(self):
+        index = TurnIndex(self.turns)
+        assert index.overlaps(800, 1200) == {'A': 200, 'B': 400}
+        assert index.overlaps(3500, 4500) == {}
+    
+    def test_speaker_for_longest_overlap(self):
+        assert TurnIndex(self.turns).speaker_for(800, 1200) == 'B'
+    
+    def test_speaker_for_nearest_turn_without_overlap(self):
+        index = TurnIndex(self.turns)
+        assert index.speaker_for(3500, 3600) == 'B'
+        assert index.speaker_for(4400, 4600) == 'C'
+        assert index.speaker_for(7000, 8000) == 'C'
+    
+    def test_empty_index(self):
+        assert TurnIndex([]).speaker_for(0, 1000) is None
+    
+    def test_overlaps_match_linear_scan(self):
+        rng = np.random.default_rng(0)
+        starts = rng.uniform(0, 60000, 200)
+        turns = [turn(s, s + d, f"S{i % 4}") for i, (s, d) in enumerate(zip(starts, rng.uniform(10, 8000, 200)))]
+        index = TurnIndex(turns)
+        for start in rng.uniform(0, 65000, 100):
+            end = start + 1500
+            expected = {}
+            for t in turns:
+                overlap = min(end, t['end']) - max(start, t['start'])
+                if overlap > 0:
+                    expected[t['speaker']] = expected.get(t['speaker'], 0.0) + overlap
+            actual = index.overlaps(start, end)
+            assert actual.keys() == expected.keys()
+            for speaker, overlap in expected.items():
+                assert actual[speaker] == pytest.approx(overlap)
+
+
+class TestAssignSpeakers:
+    turns = [turn(0, 2500, 'A'), turn(2500, 5000, 'B')]
+    
+    def test_segments_of_same_speaker_are_merged(self):
+        segments = [
+            {'start': 0.0, 'end': 1.0, 'text': "こんにちは"},
+            {'start': 1.2, 'end': 2.0, 'text': "。"},
+            {'start': 3.0, 'end': 4.0, 'text': " はい"},
+        ]
+        results = assign_speakers(segments, self.turns)
+        assert [(r['speaker'], r['start_s'], r['end_s'], r['text']) for r in results] == [
+            ('A', 0.0, 2.0, "こんにちは。"),
+            ('B', 3.0, 4.0, "はい"),
+        ]
+    
+    def test_words_split_segment_between_speakers(self):
+        segments = [{
+            'start': 0.0, 'end': 4.0, 'text': " hello there",
+            'words': [
+                {'start': 0.0, 'end': 1.0, 'word': " hello", 'probability': 0.9},
+                {'start': 1.0, 'end': 2.0, 'word': " you", 'probability': 0.7},
+                {'start': 3.0, 'end': 4.0, 'word': " there", 'probability': 0.5},
+            ]
+        }]
+        results = assign_speakers(segments, self.turns)
+        assert [(r['speaker'], r['text'], r['confidence']) for r in results] == [
+            ('A', "hello you", 0.8),
+            ('B', "there", 0.5),
+        ]
+    
+    def test_pause_longer_than_merge_gap_splits_utterance(self):
+        segments = [{'start': 0.0, 'end': 0.5, 'text': "a"}, {'start': 2.0, 'end': 2.4, 'text': "b"}]
+        assert len(assign_speakers(segments, self.turns, merge_gap_s=1.0)) == 2
+    
+    def test_incremental_assignment_matches_whole_file(self):
+        # 窓ごとに渡しても、窓をまたいで続く発話は1つにまとめられる
+        segments = [
+            {'start': i * 0.5, 'end': i * 0.5 + 0.4, 'text': f"w{i}", 'avg_logprob': -0.1 * i} for i in range(10)
+        ]
+        assigner = SpeakerAssigner(self.turns)
+        incremental = []
+        for chunk in (segments[:3], segments[3:4], [], segments[4:]):
+            incremental += assigner.add(chunk)
+        incremental += assigner.flush()
+        assert incremental == assign_speakers(segments, self.turns)
+        assert assigner.flush() == []
+
+
+class TestSpeakerIndex:
+    def test_new_speakers_are_registered(self, tmp_path):
+        index = SpeakerIndex(str(tmp_path))
+        mapping = index._match({'S0': [1.0, 0.0], 'S1': [0.0, 1.0]}, "audio1")
+        assert mapping == {'S0': 'SPK0001', 'S1': 'SPK0002'}
+        assert index.counts.tolist() == [1, 1]
+    
+    def test_known_speakers_are_matched_and_saved(self, tmp_path):
+        SpeakerIndex(str(tmp_path))._match({'S0': [1.0, 0.0], 'S1': [0.0, 1.0]}, "audio1")
+        index = SpeakerIndex(str(tmp_path))
+        mapping = index._match({'X': [0.1, 0.9], 'Y': [0.9, 0.1]}, "audio2")
+        assert mapping == {'X': 'SPK0002', 'Y': 'SPK0001'}
+        assert index.counts.tolist() == [2, 2]
+        assert SpeakerIndex(str(tmp_path)).audio_hashes == {"audio1", "audio2"}
+    
+    def test_same_audio_does_not_update_centroids(self, tmp_path):
+        index = SpeakerIndex(str(tmp_path))
+        index._match({'S0': [1.0, 0.0]}, "audio1")
+        centroids = index.centroids.copy()
+        assert index._match({'S0': [0.8, 0.6]}, "audio1") == {'S0': 'SPK0001'}
+        assert index.counts.tolist() == [1]
+        np.testing.assert_array_equal(index.centroids, centroids)
+    
+    def test_one_known_speaker_per_label(self, tmp_path):
+        index = SpeakerIndex(str(tmp_path))
+        index._match({'S0': [1.0, 0.0]}, "audio1")
+        # 2人とも同じ既知の話者に近くても、より近い方だけを対応付ける
+        mapping = index._match({'P': [0.9, 0.1], 'Q': [1.0, 0.0]}, "audio2")
+        assert mapping == {'Q': 'SPK0001', 'P': 'SPK0002'}
+    
+    def test_dissimilar_speaker_gets_new_id(self, tmp_path):
+        index = SpeakerIndex(str(tmp_path), threshold=0.5)
+        index._match({'S0': [1.0, 0.0]}, "audio1")
+        assert index._match({'S0': [0.0, 1.0]}, "audio2") == {'S0': 'SPK0002'}
+    
+    def test_dimension_mismatch_keeps_local_labels(self, tmp_path):
+        index = SpeakerIndex(str(tmp_path))
+        index._match({'S0': [1.0, 0.0]}, "audio1")
+        assert index._match({'S0': [1.0, 0.0, 0.0]}, "audio2") == {'S0': 'S0'}
+    
+    def test_identify_uses_display_names(self, tmp_path):
+        index = SpeakerIndex(str(tmp_path))
+        index.identify({'S0': [1.0, 0.0]}, "audio1")
+        (tmp_path / "names.json").write_text(json.dumps({'SPK0001': "田中"}), encoding='utf-8')
+        assert index.identify({'S1': [1.0, 0.1], 'S2': [0.0, 1.0]}, "audio2") == {'S1': "田中", 'S2': 'SPK0002'}
+    
+    def test_invalid_display_names_are_ignored(self, tmp_path):
+        (tmp_path / "names.json").write_text("[]", encoding='utf-8')
+        assert SpeakerIndex(str(tmp_path)).identify({'S0': [1.0, 0.0]}) == {'S0': 'SPK0001'}
@@ -0,0 +1,98 @@
+"""音声区間の検出と、無音を詰めた音声の時刻の対応付けのテスト"""
+import numpy as np
+import pytest
+
+from transcribe import SAMPLE_RATE, SpeechTimeline, detect_speech_regions
+
+
+def tone(seconds: float, amplitude: float = 0.5) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+
+def silence(seconds: float) -> np.ndarray:
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+
+class TestSpeechTimeline:
+    # 1〜2秒と3〜4秒の2区間（詰めた音声では0〜1秒と1〜2秒）
+    regions = [(1 * SAMPLE_RATE, 2 * SAMPLE_RATE), (3 * SAMPLE_RATE, 4 * SAMPLE_RATE)]
+    
+    def test_compact_concatenates_regions(self):
+        audio = np.arange(5 * SAMPLE_RATE, dtype=np.float32)
+        timeline = SpeechTimeline(self.regions)
+        compacted = timeline.compact(audio)
+        assert timeline.compact_length == 2 * SAMPLE_RATE
+        assert len(compacted) == timeline.compact_length
+        assert compacted[0] == SAMPLE_RATE
+        assert compacted[SAMPLE_RATE] == 3 * SAMPLE_RATE
+    
+    def test_times_inside_regions(self):
+        timeline = SpeechTimeline(self.regions)
+        assert timeline.to_original(0.0) == pytest.approx(1.0)
+        assert timeline.to_original(0.5) == pytest.approx(1.5)
+        assert timeline.to_original(1.5) == pytest.approx(3.5)
+        assert timeline.end_to_original(0.5) == pytest.approx(1.5)
+    
+    def test_splice_point_maps_to_next_start_and_previous_end(self):
+        # 継ぎ目の時刻は、開始時刻なら次の区間の始まり、終了時刻なら前の区間の終わりになる
+        timeline = SpeechTimeline(self.regions)
+        assert timeline.to_original(1.0) == pytest.approx(3.0)
+        assert timeline.end_to_original(1.0) == pytest.approx(2.0)
+    
+    def test_segment_ending_at_splice_does_not_span_skipped_silence(self):
+        timeline = SpeechTimeline(self.regions)
+        start, end = timeline.to_original(0.5), timeline.end_to_original(1.0)
+        assert (start, end) == (pytest.approx(1.5), pytest.approx(2.0))
+    
+    def test_times_past_end_are_clamped_to_last_region(self):
+        timeline = SpeechTimeline(self.regions)
+        assert timeline.to_original(2.5) == pytest.approx(4.0)
+        assert timeline.end_to_original(2.5) == pytest.approx(4.0)
+    
+    def test_without_regions(self):
+        timeline = SpeechTimeline([])
+        assert timeline.to_original(1.25) == 1.25
+        assert timeline.end_to_original(1.25) == 1.25
+        assert len(timeline.compact(np.ones(100, dtype=np.float32))) == 0
+
+
+class TestDetectSpeechRegions:
+    pad_s = 0.2
+    frame_s = 0.03
+    
+    def assert_covers(self, region, start_s: float, end_s: float):
+        # 発話の前後にpad_s（とフレーム境界の誤差）を超える余白を付けない
+        slack = (self.pad_s + self.frame_s) * SAMPLE_RATE
+        assert start_s * SAMPLE_RATE - slack <= region[0] <= start_s * SAMPLE_RATE
+        assert end_s * SAMPLE_RATE <= region[1] <= end_s * SAMPLE_RATE + slack
+    
+    def test_detects_separate_utterances(self):
+        audio = np.concatenate([silence(1), tone(1), silence(1), tone(1), silence(1)])
+        regions = detect_speech_regions(audio, pad_s=self.pad_s, frame_s=self.frame_s)
+        assert len(regions) == 2
+        self.assert_covers(regions[0], 1.0, 2.0)
+        self.assert_covers(regions[1], 3.0, 4.0)
+    
+    def test_short_pause_is_merged(self):
+        audio = np.concatenate([silence(1), tone(1), silence(0.2), tone(1), silence(1)])
+        regions = detect_speech_regions(audio, min_silence_s=0.5, pad_s=self.pad_s, frame_s=self.frame_s)
+        assert len(regions) == 1
+        self.assert_covers(regions[0], 1.0, 2.2 + 1.0)
+    
+    def test_short_noise_is_dropped(self):
+        audio = np.concatenate([silence(1), tone(0.1), silence(1)])
+        assert detect_speech_regions(audio, min_speech_s=0.25) == []
+    
+    def test_speech_at_end_extends_to_end_of_audio(self):
+        audio = np.concatenate([silence(1), tone(1.01)])
+        regions = detect_speech_regions(audio, pad_s=self.pad_s, frame_s=self.frame_s)
+        assert len(regions) == 1
+        assert regions[0][1] == len(audio)
+    
+    def test_silence_only(self):
+        assert detect_speech_regions(silence(2)) == []
+    
+    def test_audio_shorter_than_a_frame(self):
+        assert detect_speech_regions(tone(0.01)) == [(0, int(0.01 * SAMPLE_RATE))]
+        assert detect_speech_regions(silence(0)) == []
@@ -9,20 +9,27 @@ import argparse
 import sys
 from datetime import datetime
 import logging
-import tempfile
-from typing import List, Dict, Optional
+import time
+import json
+import bisect
+import hashlib
+import re
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Iterable, Iterator, Tuple, Callable, NamedTuple
 import subprocess
+import shutil
+import tempfile
+import importlib.util
 import numpy as np
-from pydub import AudioSegment
 
-# 依存ライブラリのインポート
-try:
-    import whisper
-    from pyannote.audio import Pipeline
-except ImportError as e:
-    print(f"エラー: 必要なライブラリがインストールされていません: {e}")
-    print("pip install whisper pyannote.audio pydub soundfile numpy")
-    sys.exit(1)
+# whisper・pyannote.audio・pydub（およびtorch）は起動を速くするため、必要になった処理の中で読み込む
+
+# 音声処理の共通パラメータ
+SAMPLE_RATE = 16000  # Whisper・pyannoteに渡すサンプリングレート
+DECODE_CHUNK_BYTES = 1 << 20  # FFmpeg出力を読み込む単位
 
 # ログ設定
 logging.basicConfig(
@@ -62,6 +69,62 @@ class Config:
         self.default_model = "base"
         self.output_dir = "output"
         self.config_file = "./tmp/assets/config.yaml"  # 話者分離用設定ファイル
+        # ディレクトリ指定時に処理対象とする拡張子
+        self.audio_extensions = [".wav", ".mp3", ".m4a", ".ogg", ".flac", ".aac", ".wma", ".mp4"]
+        # 話者分離時の文字起こし方式: overlap=全体を1回で文字起こしして時刻の重なりで話者を割り当て,
+        # segment=話者区間ごとに文字起こし
+        self.diarize_modes = ["overlap", "segment"]
+        self.diarize_mode = "overlap"
+        self.word_timestamps = False  # overlap方式で単語単位に話者を割り当てる
+        self.merge_gap_s = 1.0  # 同一話者の連続した発話をまとめる最大間隔（秒）
+        self.batch_size = 8  # segment方式で1度にデコードする区間数（1以下で逐次処理）
+        # segment方式で短い話者区間をまとめて1回で文字起こしする窓の設定
+        self.pack_seconds = 30.0  # 窓の最大長（秒、0以下でまとめない）
+        self.pack_gap_s = 2.0  # 同じ窓にまとめる区間同士の最大間隔（秒）
+        self.min_turn_s = 0.1  # これより短い窓は文字起こししない
+        # overlap方式で話者分離と文字起こしを並行実行する場合の設定（スレッド数未指定時はコアを等分）
+        self.parallel_diarization = False
+        self.whisper_threads = None
+        self.diarize_threads = None
+        # 文字起こし・話者分離結果のキャッシュ
+        self.use_cache = True
+        self.cache_dir = "./tmp/cache"
+        self.cache_max_mb = 1024
+        self.probe_cache_file = "./tmp/startup_probe.json"  # 起動時チェックの結果（結果キャッシュとは別に保存する）
+        # 長時間音声向けのストリーミング文字起こし
+        self.stream = False
+        self.chunk_seconds = 300  # 1度に文字起こしする窓の長さ（秒）
+        self.chunk_margin_seconds = 5  # 窓の末尾で確定を保留する長さ（次の窓と重ねて処理する）
+        # 中断後の再開用チェックポイント
+        self.use_checkpoint = True
+        self.checkpoint_dir = "./tmp/checkpoints"
+        self.checkpoint_interval = 60  # チェックポイントを書き込む最小間隔（秒）
+        self.checkpoint_max_age_days = 7  # これより古い（再開されなかった）チェックポイントは削除する
+        # エネルギーベースの音声区間検出（無音を文字起こし・話者分離から除外する）
+        self.vad = False
+        self.vad_threshold_db = -45.0  # 発話とみなす最小のフレームエネルギー（dBFS）
+        self.vad_min_speech_s = 0.25  # これより短い発話区間は無視する
+        self.vad_min_silence_s = 0.5  # これより短い無音は発話区間に含める
+        self.vad_pad_s = 0.2  # 発話区間の前後に残す余白
+        # 言語自動検出（区間・窓ごとではなく1回だけ検出して以降の処理に固定する）
+        self.language_detect_windows = 3  # 検出に使う30秒窓の最大数
+        self.language_confidence = 0.5  # この確率以上で検出結果を確定する
+        self.profile = False  # 処理段階ごとの計測結果をJSONで出力する
+        
+        # 出力形式（txt以外はセグメントごとに時刻付きで追記する）
+        self.output_formats = ["txt", "jsonl", "srt", "vtt"]
+        self.output_format = "txt"
+        
+        # CPU推論（GPUのない環境向け）
+        self.quantize = False  # Whisperの線形層をint8に動的量子化する
+        self.quantized_dir = "./tmp/assets/whisper"  # 量子化済みモデルの保存先
+        self.threads = None  # torchの演算スレッド数（intra-op、未指定時はtorchの既定値）
+        self.interop_threads = None  # 演算間の並列数（inter-op）
+        
+        # ファイルをまたいだ話者の同定（話者埋め込みの索引）
+        self.speaker_index = False
+        self.speaker_index_dir = "./tmp/speakers"
+        self.speaker_threshold = 0.5  # 既知の話者と同一人物とみなすコサイン類似度の下限
         
     def get_available_models(self) -> List[str]:
         """利用可能なモデルの一覧を返す"""
@@ -73,21 +136,74 @@ class AudioProcessor:
     def __init__(self, config: Config):
         self.config = config
         self.model = None
+        self.model_name = None  # 読み込み済みモデル名（再利用判定用）
+        self.quantized = False  # 読み込み済みモデルがint8に量子化されているか
         self.pipeline = None
-        self._temp_files = []  # 一時ファイル管理用
+    
+    def is_loaded(self, model_name: str) -> bool:
+        """指定のモデルが現在の設定（量子化の有無）で読み込み済みかを返す"""
+        return self.model is not None and self.model_name == model_name and self.quantized == self.config.quantize
         
     def load_model(self, model_name: str) -> bool:
-        """Whisperモデルを読み込む"""
+        """Whisperモデルを読み込む（同じモデルが読み込み済みなら再利用する）"""
+        if self.is_loaded(model_name):
+            logger.info(f"読み込み済みのモデル '{model_name}' を再利用します")
+            return True
         try:
-            self.model = whisper.load_model(model_name)
+            if self.config.quantize:
+                self.model = self._load_quantized_model(model_name)
+            else:
+                import whisper
+                
+                self.model = whisper.load_model(model_name)
+            self.model_name = model_name
+            self.quantized = self.config.quantize
             return True
         except Exception as e:
             logger.error(f"モデルの読み込みに失敗しました: {e}")
             return False
+    
+    def _load_quantized_model(self, model_name: str):
+        """線形層をint8に量子化したモデルを読み込む（量子化済みのモデルはディスクに保存して次回から再利用する）"""
+        import torch
+        import whisper
+        
+        cache_file = os.path.join(self.config.quantized_dir, f"{model_name}.int8.pt")
+        versions = {'whisper': whisper.__version__, 'torch': torch.__version__}
+        if os.path.exists(cache_file):
+            try:
+                saved = torch.load(cache_file, map_location="cpu", weights_only=False)
+                if saved.get('versions') == versions:
+                    logger.info(f"量子化済みモデル {cache_file} を読み込みました")
+                    return saved['model']
+                logger.info("量子化済みモデルのバージョンが異なるため、量子化し直します")
+            except Exception as e:
+                logger.warning(f"量子化済みモデルの読み込みに失敗したため、量子化し直します: {e}")
+        
+        logger.info(f"モデル '{model_name}' をint8に量子化します...")
+        model = quantize_whisper_model(whisper.load_model(model_name, device="cpu"))
+        temp_file = None
+        try:
+            os.makedirs(self.config.quantized_dir, exist_ok=True)
+            # 複数のワーカーが同時に量子化しても書き込み途中のファイルを共有しないよう、一時ファイルは個別に作る
+            fd, temp_file = tempfile.mkstemp(suffix=".tmp", dir=self.config.quantized_dir)
+            with os.fdopen(fd, 'wb') as f:
+                torch.save({'versions': versions, 'model': model}, f)
+            os.replace(temp_file, cache_file)
+            temp_file = None
+            logger.info(f"量子化済みモデルを {cache_file} に保存しました")
+        except Exception as e:
+            logger.warning(f"量子化済みモデルの保存に失敗しました: {e}")
+        finally:
+            if temp_file and os.path.exists(temp_file):
+                os.remove(temp_file)
+        return model
             
     def load_diarization_pipeline(self, config_file: str = "./tmp/assets/config.yaml") -> bool:
         """話者分離パイプラインを読み込む"""
         try:
+            from pyannote.audio import Pipeline
+            
             pipeline = Pipeline.from_pretrained(config_file)
             self.pipeline = pipeline
             return True
@@ -95,84 +211,140 @@ class AudioProcessor:
             logger.error(f"話者分離パイプラインの読み込みに失敗しました: {e}")
             return False
     
-    def convert_to_wav(self, file_path: str) -> str:
-        """音声ファイルをWAV形式に変換する"""
-        file_ext = os.path.splitext(file_path)[1].lower()
-        
-        # wavファイルならそのまま返す
-        if file_ext == '.wav':
-            return file_path
-            
-        # 一時ファイルを作成
-        temp_wav = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-        temp_wav_path = temp_wav.name
-        temp_wav.close()
-        self._temp_files.append(temp_wav_path)
-        
-        logger.info(f"ファイル形式 {file_ext} を WAV に変換しています...")
-        
+    def decode_audio(self, file_path: str) -> np.ndarray:
+        """FFmpegで音声を一度だけデコードし、16kHzモノラルのfloat32配列として返す"""
+        logger.info(f"音声ファイル '{file_path}' のデコードを開始します...")
         try:
-            # FFmpegを使用して変換
-            cmd = [
-                "ffmpeg", "-y", "-i", file_path,
-                "-ar", "16000", "-ac", "1", "-c:a", "pcm_s16le",
-                temp_wav_path
-            ]
-            
-            subprocess.run(cmd, capture_output=True, check=True)
-            logger.info(f"WAV変換が完了しました: {temp_wav_path}")
-            return temp_wav_path
+            # WAVへの一時変換を行わず、生PCM(float32)をパイプで直接受け取る
+            # stderrはパイプが詰まってFFmpegが停止しないよう一時ファイルに逃がす
+            with tempfile.TemporaryFile() as stderr_file:
+                process = subprocess.Popen(
+                    ffmpeg_decode_command(file_path), stdout=subprocess.PIPE, stderr=stderr_file
+                )
+                buffer = bytearray()
+                while True:
+                    chunk = process.stdout.read(DECODE_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    buffer += chunk
+                process.wait()
+                if process.returncode != 0:
+                    raise RuntimeError(read_stderr(stderr_file))
             
-        except subprocess.CalledProcessError as e:
-            logger.error(f"FFmpegでの変換に失敗しました")
-            return file_path
-        except Exception as e:
-            logger.error(f"ファイル変換中にエラーが発生しました: {e}")
-            return file_path
-    
-    def load_audio_data(self, wav_path: str) -> np.ndarray:
-        """音声データを読み込む（共通処理）"""
-        try:
-            audio = whisper.load_audio(wav_path)
-            logger.info("whisper.load_audioでの読み込みが完了しました")
+            # bytearrayをそのまま共有するため、書き込み可能な配列がコピーなしで得られる
+            audio = np.frombuffer(buffer, dtype=np.float32)
+            logger.info(f"デコードが完了しました（{len(audio) / SAMPLE_RATE:.1f}秒）")
             return audio
         except Exception as e:
-            logger.error(f"whisper.load_audioでの読み込みに失敗しました: {e}")
+            logger.error(f"FFmpegでのデコードに失敗しました: {e}")
             logger.info("AudioSegment.from_fileによる読み込みを試みます...")
             
             # 代替手段としてpydubを使用
-            audio_segment = AudioSegment.from_file(wav_path)
-            audio = np.array(audio_segment.get_array_of_samples()).astype(np.float32) / 32768.0
+            from pydub import AudioSegment
+            
+            audio_segment = AudioSegment.from_file(file_path).set_channels(1).set_frame_rate(SAMPLE_RATE)
+            audio = np.array(audio_segment.get_array_of_samples()).astype(np.float32)
+            audio /= float(1 << (8 * audio_segment.sample_width - 1))
             logger.info("AudioSegmentでの読み込みが完了しました")
             return audio
             
-    def transcribe(self, file_path: str, language: Optional[str] = None) -> str:
-        """音声ファイルを文字起こしする"""
+    def stream_audio(self, file_path: str, block_seconds: float, start_s: float = 0.0) -> Iterator[np.ndarray]:
+        """FFmpegの出力を一定長のブロックごとに読み出す（全体をメモリに保持しない）"""
+        block_bytes = int(block_seconds * SAMPLE_RATE) * 4  # float32は1サンプル4バイト
+        logger.info(f"音声ファイル '{file_path}' のデコードを開始します（ストリーミング）...")
+        # stderrはパイプが詰まってFFmpegが停止しないよう一時ファイルに逃がす
+        stderr_file = tempfile.TemporaryFile()
+        process = subprocess.Popen(
+            ffmpeg_decode_command(file_path, start_s), stdout=subprocess.PIPE, stderr=stderr_file
+        )
         try:
-            logger.info(f"音声ファイル '{file_path}' の処理を開始します...")
-            
-            # 音声ファイルをWAV形式に変換（必要な場合）
-            wav_path = self.convert_to_wav(file_path)
-            
-            # 音声データを読み込む
-            logger.info(f"音声ファイル '{wav_path}' の読み込みを開始します...")
-            audio = self.load_audio_data(wav_path)
-            
-            logger.info("文字起こしを開始します...")
-            result = self.model.transcribe(
-                audio=audio,
-                language=language,
-                fp16=False
-            )
-            logger.info("文字起こしが完了しました")
-            
+            while True:
+                block = process.stdout.read(block_bytes)
+                if not block:
+                    break
+                # 端数バイトは切り捨てる（通常は発生しない）
+                usable = len(block) - len(block) % 4
+                yield np.frombuffer(bytearray(block[:usable]), dtype=np.float32)
+            process.wait()
+            if process.returncode != 0:
+                raise RuntimeError(f"FFmpegでのデコードに失敗しました: {read_stderr(stderr_file)}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            stderr_file.close()
+    
+    def detect_language(
+        self,
+        audio: np.ndarray,
+        max_windows: int = 3,
+        confidence: float = 0.5
+    ) -> Tuple[Optional[str], float]:
+        """音声の代表的な位置の30秒窓から言語を検出する（確率がconfidence以上の窓があればその時点で確定）"""
+        import torch
+        import whisper
+        
+        window = 30 * SAMPLE_RATE
+        n_windows = max(1, len(audio) // window)
+        # 先頭・中央付近・末尾付近など、音声全体から等間隔に窓を選ぶ
+        count = min(max_windows, n_windows)
+        positions = sorted({int(i * (n_windows - 1) / max(1, count - 1)) for i in range(count)})
+        
+        total = {}
+        used = 0
+        for position in positions:
+            piece = audio[position * window:(position + 1) * window]
+            # ほぼ無音の窓は誤検出の原因になるため使わない
+            if len(piece) == 0 or float(np.sqrt(np.mean(piece ** 2))) < 1e-3:
+                continue
+            mel = whisper.log_mel_spectrogram(
+                whisper.pad_or_trim(piece), n_mels=self.model.dims.n_mels
+            ).to(self.model.device)
+            with torch.no_grad():
+                _, probs = self.model.detect_language(mel)
+            best = max(probs, key=probs.get)
+            logger.debug(f"{position * 30}秒付近の言語検出結果: {best} ({probs[best]:.2f})")
+            if probs[best] >= confidence:
+                return best, float(probs[best])
+            for code, prob in probs.items():
+                total[code] = total.get(code, 0.0) + prob
+            used += 1
+        
+        if not total:
+            return None, 0.0
+        best = max(total, key=total.get)
+        return best, total[best] / used
+    
+    def transcribe_segments(
+        self,
+        audio: np.ndarray,
+        language: Optional[str] = None,
+        word_timestamps: bool = False,
+        initial_prompt: Optional[str] = None
+    ) -> Dict:
+        """デコード済みの音声データを文字起こしし、タイムスタンプ付きの結果を返す"""
+        logger.info("文字起こしを開始します...")
+        result = self.model.transcribe(
+            audio=audio,
+            language=language,
+            word_timestamps=word_timestamps,
+            initial_prompt=initial_prompt,
+            fp16=False
+        )
+        logger.info("文字起こしが完了しました")
+        return result
+    
+    def transcribe(self, audio: np.ndarray, language: Optional[str] = None) -> str:
+        """デコード済みの音声データを文字起こしする"""
+        try:
+            result = self.transcribe_segments(audio, language)
             return result.get("text", "")
         except Exception as e:
             logger.error(f"文字起こしに失敗しました: {e}")
             return ""
             
-    def diarize_speakers(self, audio_path: str) -> List[Dict]:
-        """音声ファイルから話者分離を行う"""
+    def diarize_speakers(self, audio: np.ndarray, return_embeddings: bool = False):
+        """デコード済みの音声データから話者分離を行う（return_embeddingsの場合は話者ごとの埋め込みも返す）"""
         try:
             logger.info("話者分離パイプラインの読み込みを開始します...")
             if not self.pipeline:
@@ -181,11 +353,28 @@ class AudioProcessor:
                     return []
             logger.info("話者分離パイプラインの読み込みが完了しました")
             
-            # 音声ファイルをWAV形式に変換（必要な場合）
-            wav_path = self.convert_to_wav(audio_path)
+            import torch
+            
+            # Whisperと同じメモリ上の波形を共有してパイプラインに渡す
+            waveform = torch.from_numpy(audio).unsqueeze(0)
             
             logger.info("話者分離の実行を開始します...")
-            diarization = self.pipeline(wav_path)
+            inputs = {"waveform": waveform, "sample_rate": SAMPLE_RATE}
+            embeddings = {}
+            if return_embeddings:
+                try:
+                    diarization, vectors = self.pipeline(inputs, return_embeddings=True)
+                    # 埋め込みはlabels()の順に並んでいる（発話が短すぎる話者はNaNになる）
+                    embeddings = {
+                        label: np.asarray(vector, dtype=np.float32).tolist()
+                        for label, vector in zip(diarization.labels(), vectors)
+                        if np.all(np.isfinite(vector))
+                    }
+                except TypeError:
+                    logger.warning("話者分離パイプラインが話者埋め込みの出力に対応していないため、話者の同定は行いません")
+                    diarization = self.pipeline(inputs)
+            else:
+                diarization = self.pipeline(inputs)
             logger.info("話者分離の実行が完了しました")
             
             logger.info("話者セグメントの処理を開始します...")
@@ -200,21 +389,622 @@ class AudioProcessor:
                 })
             logger.info(f"話者セグメントの処理が完了しました。検出された話者数: {len(set(seg['speaker'] for seg in segments))}")
             
-            return segments
+            return (segments, embeddings) if return_embeddings else segments
         except Exception as e:
             logger.error(f"話者分離に失敗しました: {e}")
-            return []
+            return ([], {}) if return_embeddings else []
+
+def peak_rss_mb() -> Optional[float]:
+    """プロセスの最大常駐メモリ量（MB）を返す（取得できない環境ではNone）"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linuxはキロバイト、macOSはバイト単位
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    except Exception:
+        return None
+
+def current_rss_mb() -> Optional[float]:
+    """プロセスの現在の常駐メモリ量（MB）を返す（取得できない環境ではNone）"""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except Exception:
+        return None
+
+def memory_delta(before: Optional[float], after: Optional[float]) -> Optional[float]:
+    """メモリ量の増減（MB）を返す（どちらかが取得できなければNone）"""
+    if before is None or after is None:
+        return None
+    return round(after - before, 1)
+
+class StageProfiler:
+    """処理段階ごとの経過時間・CPU時間・メモリ量・処理した音声の長さを記録するクラス"""
     
-    def cleanup_temp_files(self):
-        """一時ファイルをクリーンアップ"""
-        for temp_file in self._temp_files:
-            if os.path.exists(temp_file):
-                try:
-                    os.unlink(temp_file)
-                    logger.info(f"一時ファイル {temp_file} を削除しました")
-                except Exception as e:
-                    logger.warning(f"一時ファイルの削除に失敗しました: {e}")
-        self._temp_files.clear()
+    def __init__(self):
+        self.stages = []
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+    
+    @contextmanager
+    def stage(self, name: str, audio_s: Optional[float] = None):
+        """with文で囲んだ処理を1つの段階として計測する（audio_sは後から記録を更新してもよい）"""
+        record = {'stage': name, 'audio_s': audio_s}
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        rss_start = current_rss_mb()
+        peak_start = peak_rss_mb()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = round(time.perf_counter() - wall_start, 4)
+            # CPU時間・メモリ量はプロセス全体の値（並行実行中の他の段階の分も含む）
+            record['cpu_s'] = round(time.process_time() - cpu_start, 4)
+            rss_end = current_rss_mb()
+            record['rss_mb'] = round(rss_end, 1) if rss_end is not None else None
+            # 段階の前後での常駐メモリ量の増減と、段階中に更新されたプロセスの最大メモリ量の増分
+            record['rss_delta_mb'] = memory_delta(rss_start, rss_end)
+            record['peak_increase_mb'] = memory_delta(peak_start, peak_rss_mb())
+            if record['audio_s'] and record['wall_s'] > 0:
+                record['audio_s_per_s'] = round(record['audio_s'] / record['wall_s'], 3)
+            self.stages.append(record)
+    
+    def report(self, audio_s: Optional[float] = None) -> Dict:
+        """計測結果を段階ごとに集計したレポートを返す"""
+        summary = {}
+        for record in self.stages:
+            total = summary.setdefault(record['stage'], {'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'audio_s': 0.0})
+            total['count'] += 1
+            total['wall_s'] += record['wall_s']
+            total['cpu_s'] += record['cpu_s']
+            total['audio_s'] += record['audio_s'] or 0.0
+        for total in summary.values():
+            total['wall_s'] = round(total['wall_s'], 4)
+            total['cpu_s'] = round(total['cpu_s'], 4)
+            if total['audio_s'] and total['wall_s'] > 0:
+                total['audio_s_per_s'] = round(total['audio_s'] / total['wall_s'], 3)
+        
+        wall_s = time.perf_counter() - self._start_wall
+        report = {
+            'total_wall_s': round(wall_s, 4),
+            'total_cpu_s': round(time.process_time() - self._start_cpu, 4),
+            'peak_rss_mb': peak_rss_mb(),
+            'audio_s': audio_s,
+            'summary': summary,
+            'stages': self.stages
+        }
+        if audio_s and wall_s > 0:
+            # 実時間比（1秒あたりに処理した音声の秒数）
+            report['audio_s_per_s'] = round(audio_s / wall_s, 3)
+        return report
+
+class SpeechTimeline:
+    """音声区間だけを詰めた音声と元の音声の時刻を対応付けるクラス"""
+    
+    def __init__(self, regions: List[Tuple[int, int]]):
+        self.regions = regions
+        # 詰めた音声上での各区間の開始サンプル位置
+        self.compact_starts = []
+        position = 0
+        for start, end in regions:
+            self.compact_starts.append(position)
+            position += end - start
+        self.compact_length = position
+    
+    def compact(self, audio: np.ndarray) -> np.ndarray:
+        """音声区間だけを連結した音声を返す"""
+        if not self.regions:
+            return audio[:0]
+        return np.concatenate([audio[start:end] for start, end in self.regions])
+    
+    def to_original(self, time_s: float) -> float:
+        """詰めた音声上の時刻（秒）を元の音声上の時刻に変換する"""
+        return self._map(time_s, bisect.bisect_right)
+    
+    def end_to_original(self, time_s: float) -> float:
+        """終了時刻を元の音声上の時刻に変換する（区間の継ぎ目は前の区間の終わりとみなす）"""
+        return self._map(time_s, bisect.bisect_left)
+    
+    def _map(self, time_s: float, search) -> float:
+        """二分探索の関数で時刻が属する区間を決めて元の音声上の時刻に変換する"""
+        if not self.regions:
+            return time_s
+        sample = time_s * SAMPLE_RATE
+        i = max(0, search(self.compact_starts, sample) - 1)
+        start, end = self.regions[i]
+        original = start + min(sample - self.compact_starts[i], end - start)
+        return original / SAMPLE_RATE
+
+def detect_speech_regions(
+    audio: np.ndarray,
+    threshold_db: float = -45.0,
+    min_speech_s: float = 0.25,
+    min_silence_s: float = 0.5,
+    pad_s: float = 0.2,
+    frame_s: float = 0.03
+) -> List[Tuple[int, int]]:
+    """フレームごとのエネルギーから発話区間（サンプル位置の組）を検出する"""
+    frame = int(frame_s * SAMPLE_RATE)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return [(0, len(audio))] if len(audio) else []
+    
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    # 2乗した配列を作らずにフレームごとの平均パワーを求める
+    power = np.einsum('ij,ij->i', frames, frames) / frame
+    energy_db = 10.0 * np.log10(power + 1e-10)
+    # 背景雑音の大きさに応じてしきい値を引き上げる
+    threshold = max(threshold_db, float(np.percentile(energy_db, 10)) + 10.0)
+    is_speech = energy_db > threshold
+    
+    # 連続する発話フレームを区間にまとめる
+    edges = np.diff(np.concatenate(([0], is_speech.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    
+    min_silence = int(min_silence_s / frame_s)
+    min_speech = int(min_speech_s / frame_s)
+    pad = int(pad_s / frame_s)
+    
+    regions = []
+    for start, end in zip(starts, ends):
+        if regions and start - regions[-1][1] < min_silence:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    
+    speech = []
+    for start, end in regions:
+        if end - start < min_speech:
+            continue
+        start = max(0, start - pad) * frame
+        end = min(n_frames, end + pad) * frame
+        if end == n_frames * frame:
+            end = len(audio)
+        if speech and start <= speech[-1][1]:
+            speech[-1] = (speech[-1][0], max(speech[-1][1], end))
+        else:
+            speech.append((start, end))
+    return speech
+
+class ResultCache:
+    """デコード済み音声のハッシュをキーとする結果キャッシュ（サイズ上限付きLRU）"""
+    
+    # キャッシュする結果の種類（種類ごとのサブディレクトリ以外のファイルは上限・削除の対象にしない）
+    kinds = ("transcription", "diarization")
+    
+    def __init__(self, cache_dir: str, max_mb: float = 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+    
+    @staticmethod
+    def audio_hash(audio: np.ndarray) -> str:
+        """音声データのハッシュ値を計算する"""
+        return hashlib.sha256(np.ascontiguousarray(audio).data).hexdigest()
+    
+    @staticmethod
+    def make_key(*parts) -> str:
+        """キーの構成要素からキャッシュキーを作る"""
+        return hashlib.sha256("\x1f".join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.cache_dir, kind, f"{key}.json")
+    
+    def get(self, kind: str, key: str) -> Optional[Dict]:
+        """キャッシュを読み込む（存在しなければNone）"""
+        path = self._path(kind, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # 最終利用日時を更新してLRUの順序に反映する
+            os.utime(path, None)
+            return data
+        except Exception as e:
+            logger.warning(f"キャッシュの読み込みに失敗しました: {e}")
+            return None
+    
+    def put(self, kind: str, key: str, data: Dict):
+        """キャッシュを書き込み、上限を超えた分を古い順に削除する"""
+        path = self._path(kind, key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_json_atomic(path, data)
+            self.evict()
+        except Exception as e:
+            logger.warning(f"キャッシュの書き込みに失敗しました: {e}")
+    
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for kind in self.kinds:
+            kind_dir = os.path.join(self.cache_dir, kind)
+            if not os.path.isdir(kind_dir):
+                continue
+            for name in os.listdir(kind_dir):
+                if name.endswith('.json'):
+                    path = os.path.join(kind_dir, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        # 他のワーカープロセスが削除した直後のエントリ
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+    
+    def evict(self):
+        """合計サイズが上限を超えている場合、最終利用日時の古いものから削除する"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            logger.debug(f"キャッシュを削除しました: {path}")
+    
+    def clear(self):
+        """キャッシュをすべて削除する"""
+        removed = 0
+        for _, _, path in self._entries():
+            os.unlink(path)
+            removed += 1
+        logger.info(f"キャッシュを {removed} 件削除しました")
+
+class Checkpoint:
+    """長時間の処理の途中経過を保存し、同じ入力・設定での再実行時に再開するためのクラス"""
+    
+    def __init__(self, path: str, interval_s: float = 60):
+        self.path = path
+        self.interval_s = interval_s
+        self.data = {}
+        self._last_save = time.monotonic()
+        # 話者分離と文字起こしを並列に実行する場合は別スレッドから更新・保存される
+        self._lock = threading.RLock()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.data = json.load(f)
+                logger.info(f"チェックポイントから再開します: {path}")
+            except Exception as e:
+                logger.warning(f"チェックポイントの読み込みに失敗したため、最初から処理します: {e}")
+                self.data = {}
+    
+    @classmethod
+    def for_job(cls, checkpoint_dir: str, file_path: str, options: Dict, interval_s: float = 60) -> 'Checkpoint':
+        """入力ファイル（パス・サイズ・更新日時）と処理設定に対応するチェックポイントを返す"""
+        stat = os.stat(file_path)
+        key = ResultCache.make_key(
+            os.path.abspath(file_path), stat.st_size, stat.st_mtime,
+            json.dumps(options, sort_keys=True)
+        )
+        return cls(os.path.join(checkpoint_dir, f"{key}.json"), interval_s)
+    
+    @staticmethod
+    def prune(checkpoint_dir: str, max_age_days: float):
+        """一定期間更新されていないチェックポイントを削除する"""
+        if not os.path.isdir(checkpoint_dir):
+            return
+        cutoff = time.time() - max_age_days * 86400
+        removed = 0
+        for name in os.listdir(checkpoint_dir):
+            path = os.path.join(checkpoint_dir, name)
+            try:
+                if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+                    removed += 1
+            except OSError as e:
+                logger.warning(f"古いチェックポイントの削除に失敗しました: {e}")
+        if removed:
+            logger.info(f"{max_age_days}日以上更新されていないチェックポイントを {removed} 件削除しました")
+    
+    def get(self, name: str, default=None):
+        """保存済みの値を返す"""
+        return self.data.get(name, default)
+    
+    def update(self, force: bool = False, **values):
+        """値を更新し、前回の書き込みから一定時間が経過していれば保存する"""
+        with self._lock:
+            self.data.update(values)
+            if force or time.monotonic() - self._last_save >= self.interval_s:
+                self.save()
+    
+    def save(self):
+        """チェックポイントをファイルに書き込む"""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # 古い内容が新しい内容を上書きしないよう、書き込みの完了までロックを保持する
+            with self._lock:
+                write_json_atomic(self.path, self.data)
+                self._last_save = time.monotonic()
+            logger.debug(f"チェックポイントを保存しました: {self.path}")
+        except Exception as e:
+            logger.warning(f"チェックポイントの保存に失敗しました: {e}")
+    
+    def clear(self):
+        """処理完了後にチェックポイントを削除する"""
+        with self._lock:
+            self.data = {}
+        if os.path.exists(self.path):
+            try:
+                os.unlink(self.path)
+            except Exception as e:
+                logger.warning(f"チェックポイントの削除に失敗しました: {e}")
+
+def write_json_atomic(path: str, data: Dict):
+    """書き込みごとに一意な一時ファイルを経由して、JSONを置き換える"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+@contextmanager
+def file_lock(lock_path: str, timeout_s: float = 120, stale_s: float = 600):
+    """ロックファイルを排他的に作成し、プロセス間で処理を直列化する"""
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    deadline = time.monotonic() + timeout_s
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            # 異常終了したプロセスが残したロックは一定時間で無効とみなす
+            try:
+                if time.time() - os.path.getmtime(lock_path) > stale_s:
+                    logger.warning(f"古いロックファイルを削除します: {lock_path}")
+                    os.unlink(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"ロックを取得できませんでした: {lock_path}")
+            time.sleep(0.05)
+    try:
+        os.write(fd, str(os.getpid()).encode('ascii'))
+        os.close(fd)
+        yield
+    finally:
+        try:
+            os.unlink(lock_path)
+        except FileNotFoundError:
+            pass
+
+class SpeakerIndex:
+    """話者埋め込みの重心をNumPy配列で保持し、ファイルをまたいで同じ話者を同定する索引"""
+    
+    def __init__(self, index_dir: str, threshold: float = 0.5):
+        self.path = os.path.join(index_dir, "index.npz")
+        self.names_file = os.path.join(index_dir, "names.json")  # 話者IDと表示名の対応（手動で編集できる）
+        self.lock_file = os.path.join(index_dir, "index.lock")  # 読み込みから保存までを複数のプロセスで直列化する
+        self.threshold = threshold
+        self.ids = []
+        self.centroids = np.zeros((0, 0), dtype=np.float32)  # 正規化済みの重心（話者数 x 次元数）
+        self.counts = np.zeros(0, dtype=np.int64)  # 重心の計算に使った埋め込みの数
+        self.audio_hashes = set()  # 登録済みの音声（同じ音声で重心を二重に更新しない）
+        self._load()
+    
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                self.ids = [str(speaker_id) for speaker_id in data['ids']]
+                self.centroids = data['centroids'].astype(np.float32)
+                self.counts = data['counts'].astype(np.int64)
+                self.audio_hashes = {str(h) for h in data['audio_hashes']}
+            logger.info(f"話者の索引を読み込みました（{len(self.ids)} 人）")
+        except Exception as e:
+            logger.warning(f"話者の索引の読み込みに失敗しました: {e}")
+    
+    def save(self):
+        """索引を保存する（書き込み途中で終了しても壊れないよう一時ファイルから置き換える）"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.savez(
+                f,
+                ids=np.array(self.ids, dtype=str),
+                centroids=self.centroids,
+                counts=self.counts,
+                audio_hashes=np.array(sorted(self.audio_hashes), dtype=str)
+            )
+        os.replace(temp_path, self.path)
+    
+    def display_names(self) -> Dict[str, str]:
+        """話者IDごとの表示名（names.jsonで指定されたもの）"""
+        try:
+            with open(self.names_file, 'r', encoding='utf-8') as f:
+                names = json.load(f)
+        except (OSError, ValueError) as e:
+            if os.path.exists(self.names_file):
+                logger.warning(f"話者の表示名を読み込めないため、話者IDをそのまま使用します: {e}")
+            return {}
+        if not isinstance(names, dict):
+            logger.warning(f"話者の表示名はオブジェクト形式で指定してください: {self.names_file}")
+            return {}
+        return {str(speaker_id): str(name) for speaker_id, name in names.items()}
+    
+    def identify(self, embeddings: Dict[str, List[float]], audio_hash: Optional[str] = None) -> Dict[str, str]:
+        """ファイル内の話者ラベルを既知の話者IDに対応付ける（一致しない話者は新しいIDとして登録する）"""
+        if not embeddings:
+            return {}
+        # 複数のワーカーが同じIDを登録したり重心を上書きし合ったりしないよう、照合から保存までをロックする
+        with file_lock(self.lock_file):
+            # 他のプロセスが登録した話者を反映するため、照合の前に読み込み直す
+            self._load()
+            mapping = self._match(embeddings, audio_hash)
+        names = self.display_names()
+        return {label: names.get(speaker_id, speaker_id) for label, speaker_id in mapping.items()}
+    
+    def _match(self, embeddings: Dict[str, List[float]], audio_hash: Optional[str]) -> Dict[str, str]:
+        """話者ラベルを話者IDに対応付け、索引を更新して保存する"""
+        labels = list(embeddings)
+        vectors = np.array([embeddings[label] for label in labels], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        update = audio_hash is None or audio_hash not in self.audio_hashes
+        
+        mapping = {}
+        if len(self.ids) and self.centroids.shape[1] == vectors.shape[1]:
+            # 類似度の高い組から順に、1つのファイル内で同じIDを重複して使わないよう割り当てる
+            similarity = vectors @ self.centroids.T
+            for flat in np.argsort(-similarity, axis=None):
+                row, column = np.unravel_index(flat, similarity.shape)
+                if similarity[row, column] < self.threshold:
+                    break
+                if labels[row] in mapping or self.ids[column] in mapping.values():
+                    continue
+                mapping[labels[row]] = self.ids[column]
+                if update:
+                    self._update_centroid(column, vectors[row])
+        elif len(self.ids):
+            logger.warning("話者埋め込みの次元が索引と異なるため、既知の話者とは照合しません")
+            return {label: label for label in labels}
+        
+        for row, label in enumerate(labels):
+            if label not in mapping:
+                mapping[label] = self._register(vectors[row])
+        
+        if audio_hash:
+            self.audio_hashes.add(audio_hash)
+        self.save()
+        return mapping
+    
+    def _update_centroid(self, column: int, vector: np.ndarray):
+        """一致した話者の重心に埋め込みを加える"""
+        count = self.counts[column]
+        centroid = self.centroids[column] * count + vector
+        self.centroids[column] = centroid / max(float(np.linalg.norm(centroid)), 1e-12)
+        self.counts[column] = count + 1
+    
+    def _register(self, vector: np.ndarray) -> str:
+        """新しい話者を登録してIDを返す"""
+        speaker_id = f"SPK{len(self.ids) + 1:04d}"
+        self.ids.append(speaker_id)
+        self.centroids = vector[None, :] if not len(self.centroids) else np.vstack([self.centroids, vector])
+        self.counts = np.append(self.counts, 1)
+        return speaker_id
+
+class SegmentRecord(NamedTuple):
+    """文字起こし結果の1セグメント（時刻は元の音声上の秒）"""
+    start: float
+    end: float
+    speaker: Optional[str]
+    text: str
+    confidence: Optional[float] = None
+
+def segment_confidence(segment: Dict) -> Optional[float]:
+    """Whisperのセグメントの信頼度（単語確率の平均、なければ平均対数確率から求める）"""
+    probabilities = [word['probability'] for word in segment.get('words') or [] if 'probability' in word]
+    if probabilities:
+        return round(sum(probabilities) / len(probabilities), 3)
+    if segment.get('avg_logprob') is not None:
+        return round(float(np.exp(segment['avg_logprob'])), 3)
+    return None
+
+def format_timestamp(seconds: float, separator: str = ".") -> str:
+    """秒を字幕用の時刻表記（HH:MM:SS.mmm）に変換する"""
+    milliseconds = int(round(max(0.0, seconds) * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}"
+
+class SegmentWriter:
+    """セグメントを1件ずつファイルに追記する出力形式の基底クラス"""
+    
+    extension = ".txt"
+    
+    def __init__(self, f, start_index: int = 1):
+        self.f = f
+        self.index = start_index  # 次に書き込むセグメントの番号（字幕の連番に使う）
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.f.close()
+    
+    def header(self) -> str:
+        """新しいファイルの先頭に書き込む内容"""
+        return ""
+    
+    def format(self, record: SegmentRecord) -> str:
+        raise NotImplementedError
+    
+    def write(self, record: SegmentRecord):
+        """セグメントを追記し、途中経過を読めるようすぐにフラッシュする"""
+        self.f.write(self.format(record))
+        self.f.flush()
+        self.index += 1
+
+class TextSegmentWriter(SegmentWriter):
+    """従来のテキスト形式（話者がある場合は「話者 X [開始 - 終了]: テキスト」）"""
+    
+    def format(self, record: SegmentRecord) -> str:
+        if record.speaker is None:
+            return f"{record.text}\n"
+        return f"話者 {record.speaker} [{record.start:.2f}s - {record.end:.2f}s]: {record.text}\n"
+
+class JsonlSegmentWriter(SegmentWriter):
+    """1行1セグメントのJSON Lines形式"""
+    
+    extension = ".jsonl"
+    
+    def format(self, record: SegmentRecord) -> str:
+        data = record._asdict()
+        data['start'] = round(record.start, 3)
+        data['end'] = round(record.end, 3)
+        return json.dumps(data, ensure_ascii=False) + "\n"
+
+class SrtSegmentWriter(SegmentWriter):
+    """SRT字幕形式"""
+    
+    extension = ".srt"
+    
+    def format(self, record: SegmentRecord) -> str:
+        text = f"{record.speaker}: {record.text}" if record.speaker else record.text
+        return (f"{self.index}\n{format_timestamp(record.start, ',')} --> {format_timestamp(record.end, ',')}\n"
+                f"{text}\n\n")
+
+class VttSegmentWriter(SegmentWriter):
+    """WebVTT字幕形式（話者はvoiceタグで表す）"""
+    
+    extension = ".vtt"
+    
+    def header(self) -> str:
+        return "WEBVTT\n\n"
+    
+    def format(self, record: SegmentRecord) -> str:
+        text = f"<v {record.speaker}>{record.text}" if record.speaker else record.text
+        return f"{format_timestamp(record.start)} --> {format_timestamp(record.end)}\n{text}\n\n"
+
+# 出力形式名と書き込みクラスの対応
+SEGMENT_WRITERS = {
+    'txt': TextSegmentWriter,
+    'jsonl': JsonlSegmentWriter,
+    'srt': SrtSegmentWriter,
+    'vtt': VttSegmentWriter
+}
 
 class Transcriber:
     """文字起こし処理を管理するクラス"""
@@ -222,6 +1012,22 @@ class Transcriber:
     def __init__(self, config: Config):
         self.config = config
         self.audio_processor = AudioProcessor(config)
+        self.model_load_seconds = 0.0  # モデル読み込みに要した累計時間
+        self.cache = ResultCache(config.cache_dir, config.cache_max_mb) if config.use_cache else None
+        if config.use_checkpoint:
+            Checkpoint.prune(config.checkpoint_dir, config.checkpoint_max_age_days)
+        self._audio_hash = None  # 処理中の音声のハッシュ（キャッシュキー用）
+        self._model_name = None
+        self._language = None
+        self.checkpoint = None  # 処理中のファイルのチェックポイント
+        self.timeline = None  # 音声区間検出で無音を除いた場合の時刻対応
+        self.run_info = {}  # 直近の処理の実行レポート
+        self.profiler = StageProfiler()
+        self.records = []  # 直近の処理の文字起こし結果（SegmentRecordのリスト）
+        self.error = None  # 直近の処理が途中で失敗した場合のエラー（recordsは途中までの結果）
+        self.speaker_index = SpeakerIndex(config.speaker_index_dir, config.speaker_threshold) if config.speaker_index else None
+        self._speaker_embeddings = {}  # 直近の話者分離で得た話者ラベルごとの埋め込み
+        self.on_record = None  # セグメントが確定するたびに呼ばれるコールバック
         
     def transcribe_audio(
         self,
@@ -232,151 +1038,1612 @@ class Transcriber:
     ) -> str:
         """音声ファイルを文字起こしする"""
         try:
-            logger.info(f"モデル '{model_name}' の読み込みを開始します...")
-            if not self.audio_processor.load_model(model_name):
-                logger.error(f"モデル '{model_name}' の読み込みに失敗しました")
-                return ""
-            logger.info(f"モデル '{model_name}' の読み込みが完了しました")
+            # モデルは文字起こしが必要になった時点で読み込む（キャッシュやチェックポイントで済む場合は読み込まない）
+            self._model_name = model_name
+            self.records = []
+            self.error = None
+            
+            # 音声は一度だけデコードし、文字起こしと話者分離で共有する
+            with self.profiler.stage("decode") as record:
+                audio = self.audio_processor.decode_audio(file_path)
+                record['audio_s'] = len(audio) / SAMPLE_RATE
+            self.run_info = {'audio_s': round(len(audio) / SAMPLE_RATE, 3)}
+            self.timeline = None
+            if self.config.vad:
+                with self.profiler.stage("vad", len(audio) / SAMPLE_RATE):
+                    audio = self._skip_silence(audio)
+                if len(audio) == 0:
+                    logger.warning("発話区間が検出されませんでした")
+                    return ""
+            self._language = language
+            self._audio_hash = ResultCache.audio_hash(audio) if self.cache or self.speaker_index else None
                 
             if diarize:
-                return self._transcribe_with_diarization(file_path, language)
+                return self._transcribe_with_diarization(audio, language)
             else:
                 logger.info("通常の文字起こしを開始します...")
-                transcription_text = self.audio_processor.transcribe(file_path, language)
+                transcription_text = self._transcribe_text(audio, language)
                 logger.info("通常の文字起こしが完了しました")
                 return transcription_text
                 
         except Exception as e:
             logger.error(f"文字起こし処理中にエラーが発生しました: {e}", exc_info=True)
+            self.error = str(e)
             return ""
-        finally:
-            # 一時ファイルのクリーンアップ
-            self.audio_processor.cleanup_temp_files()
     
-    def _transcribe_with_diarization(self, file_path: str, language: Optional[str]) -> str:
-        """話者分離付き文字起こしを実行"""
-        logger.info("話者分離を開始します...")
-        speaker_segments = self.audio_processor.diarize_speakers(file_path)
-        logger.info("話者分離が完了しました")
-        
-        if not speaker_segments:
-            logger.warning("話者分離に失敗したため、通常の文字起こしにフォールバックします")
-            return self.audio_processor.transcribe(file_path, language)
+    def _skip_silence(self, audio: np.ndarray) -> np.ndarray:
+        """音声区間を検出し、発話部分だけを連結した音声を返す"""
+        logger.info("音声区間の検出を開始します...")
+        regions = detect_speech_regions(
+            audio,
+            threshold_db=self.config.vad_threshold_db,
+            min_speech_s=self.config.vad_min_speech_s,
+            min_silence_s=self.config.vad_min_silence_s,
+            pad_s=self.config.vad_pad_s
+        )
+        self.timeline = SpeechTimeline(regions)
+        skipped_s = (len(audio) - self.timeline.compact_length) / SAMPLE_RATE
+        self.run_info['speech_regions'] = len(regions)
+        self.run_info['skipped_s'] = round(skipped_s, 3)
+        logger.info(f"音声区間の検出が完了しました（{len(regions)} 区間, 無音 {skipped_s:.1f}秒"
+                    f" / {len(audio) / SAMPLE_RATE:.1f}秒 をスキップ）")
+        return self.timeline.compact(audio)
+    
+    def _checkpoint_get(self, name: str, default=None):
+        """チェックポイントが有効な場合に保存済みの値を返す"""
+        return self.checkpoint.get(name, default) if self.checkpoint else default
+    
+    def _checkpoint_update(self, force: bool = False, **values):
+        """チェックポイントが有効な場合に値を更新する"""
+        if self.checkpoint:
+            self.checkpoint.update(force=force, **values)
+    
+    def _emit(self, start_s: float, end_s: float, text: str, speaker: Optional[str] = None, confidence: Optional[float] = None):
+        """確定したセグメントを元の音声の時刻で記録し、コールバックに渡す"""
+        if self.timeline:
+            start_s = self.timeline.to_original(start_s)
+            end_s = self.timeline.end_to_original(end_s)
+        self._record(SegmentRecord(start_s, end_s, speaker, text, confidence))
+    
+    def _record(self, record: SegmentRecord):
+        """元の音声の時刻に直したセグメントを記録し、コールバックに渡す"""
+        self.records.append(record)
+        if self.on_record:
+            self.on_record(record)
+    
+    def _emit_whisper_segments(self, result: Dict) -> str:
+        """話者なしのWhisperの結果をセグメントごとに記録し、全体のテキストを返す"""
+        self._emit_segments(result.get('segments', []))
+        return result.get("text", "")
+    
+    def _emit_segments(self, segments: List[Dict]):
+        """話者なしのWhisperのセグメントを記録する"""
+        for segment in segments:
+            text = segment['text'].strip()
+            if text:
+                self._emit(segment['start'], segment['end'], text, confidence=segment_confidence(segment))
+    
+    def _ensure_model(self, model_name: str) -> bool:
+        """Whisperモデルを読み込む（読み込み済みなら再利用する）"""
+        logger.info(f"モデル '{model_name}' の読み込みを開始します...")
+        if self.audio_processor.is_loaded(model_name):
+            return self.audio_processor.load_model(model_name)
+        load_start = time.perf_counter()
+        with self.profiler.stage("model_load"):
+            loaded = self.audio_processor.load_model(model_name)
+        if not loaded:
+            logger.error(f"モデル '{model_name}' の読み込みに失敗しました")
+            return False
+        self.model_load_seconds += time.perf_counter() - load_start
+        logger.info(f"モデル '{model_name}' の読み込みが完了しました")
+        return True
+    
+    def _require_model(self):
+        """処理に必要になった時点でWhisperモデルを読み込む（失敗した場合は例外を送出）"""
+        if self._model_name is None and self.audio_processor.model is not None:
+            return
+        if not self._ensure_model(self._model_name or self.config.default_model):
+            raise RuntimeError(f"モデル '{self._model_name}' を読み込めません")
+    
+    def _resolve_language(self, audio: np.ndarray, language: Optional[str]) -> Optional[str]:
+        """言語が未指定なら音声から1回だけ検出し、以降の区間・窓で使う言語として固定する"""
+        if language:
+            return language
+        saved = self._checkpoint_get('language')
+        if saved:
+            self.run_info['language'] = saved
+            return saved
         
-        # 音声ファイルをWAV形式に変換（必要な場合）
-        wav_path = self.audio_processor.convert_to_wav(file_path)
+        self._require_model()
+        logger.info("言語の自動検出を開始します...")
+        with self.profiler.stage("language_detection"):
+            detected, probability = self.audio_processor.detect_language(
+                audio,
+                max_windows=self.config.language_detect_windows,
+                confidence=self.config.language_confidence
+            )
+        if detected is None:
+            logger.warning("言語を検出できなかったため、区間ごとの自動検出を行います")
+            return None
+        logger.info(f"言語を '{detected}' と検出しました（確率 {probability:.2f}）。以降の処理はこの言語に固定します")
+        self.run_info['language'] = detected
+        self.run_info['language_probability'] = round(probability, 3)
+        self._checkpoint_update(force=True, language=detected)
+        return detected
+    
+    def transcribe_stream(
+        self,
+        file_path: str,
+        model_name: str = "base",
+        language: Optional[str] = None
+    ) -> int:
+        """音声を重なりのある窓ごとにデコード・文字起こしし、確定したセグメントを順次コールバックに渡す"""
+        self._model_name = model_name
+        self.records = []
         
-        # 音声データを読み込む
-        logger.info(f"音声ファイル '{wav_path}' の読み込みを開始します...")
-        audio = self.audio_processor.load_audio_data(wav_path)
+        window = int(self.config.chunk_seconds * SAMPLE_RATE)
+        margin = int(min(self.config.chunk_margin_seconds, self.config.chunk_seconds / 2) * SAMPLE_RATE)
+        block_seconds = max(1.0, min(30.0, self.config.chunk_seconds / 4))
         
-        logger.info("話者別の文字起こしを開始します...")
-        results = []
+        buffer = np.zeros(0, dtype=np.float32)
+        buffer_offset = self._checkpoint_get('offset_samples', 0)  # bufferの先頭の元音声上のサンプル位置
+        prompt = self._checkpoint_get('prompt')  # 前の窓の末尾のテキスト（デコーダの文脈として引き継ぐ）
+        language = language or self._checkpoint_get('language')
+        committed = self._checkpoint_get('committed', 0)
         
-        # 各話者のセグメントについて文字起こしを実行
-        for i, segment_info in enumerate(speaker_segments, 1):
-            start_time_ms = segment_info['start']
-            end_time_ms = segment_info['end']
-            speaker = segment_info['speaker']
-            
-            # セグメントの開始・終了時間をサンプル数に変換
-            start_sample = int(start_time_ms * 16)  # 16kHzなので1msあたり16サンプル
-            end_sample = int(end_time_ms * 16)
-            
-            # 音声データのセグメントを切り出し
-            if start_sample < len(audio) and end_sample <= len(audio):
-                segment_audio = audio[start_sample:end_sample]
-            else:
-                logger.warning(f"セグメント範囲が音声データの範囲外です: {start_sample}:{end_sample}, len={len(audio)}")
-                continue
+        if buffer_offset:
+            logger.info(f"{buffer_offset / SAMPLE_RATE:.1f}秒からストリーミング文字起こしを再開します...")
+        else:
+            logger.info(f"ストリーミング文字起こしを開始します（窓 {self.config.chunk_seconds}秒）...")
+        blocks = self.audio_processor.stream_audio(file_path, block_seconds, start_s=buffer_offset / SAMPLE_RATE)
+        finished = False
+        while not finished:
+            # 窓の長さになるまで読み進める
+            while len(buffer) < window:
+                block = next(blocks, None)
+                if block is None:
+                    finished = True
+                    break
+                buffer = np.concatenate([buffer, block])
+            if len(buffer) == 0:
+                break
             
-            # セグメントが短すぎる場合はスキップ
-            if len(segment_audio) < 1600:  # 100ms未満はスキップ
-                logger.info(f"セグメント {i} は短すぎるためスキップします（{len(segment_audio)} サンプル）")
-                continue
+            chunk = buffer[:window]
+            self._require_model()
+            if language is None:
+                # 確率の高い窓が見つかるまで窓ごとに検出し、見つかった時点で固定する
+                with self.profiler.stage("language_detection"):
+                    detected, probability = self.audio_processor.detect_language(
+                        chunk,
+                        max_windows=self.config.language_detect_windows,
+                        confidence=self.config.language_confidence
+                    )
+                if detected and (probability >= self.config.language_confidence or finished):
+                    language = detected
+                    logger.info(f"言語を '{language}' と検出しました（確率 {probability:.2f}）。以降の窓はこの言語に固定します")
+                    self.run_info['language'] = language
+                    self.run_info['language_probability'] = round(probability, 3)
+            with self.profiler.stage("stream_window", len(chunk) / SAMPLE_RATE):
+                result = self.audio_processor.transcribe_segments(chunk, language, initial_prompt=prompt)
             
-            # 文字起こし実行
-            logger.info(f"話者 {speaker} のセグメント {i}/{len(speaker_segments)} の文字起こしを開始します...")
-            try:
-                transcription_result = self.audio_processor.model.transcribe(
-                    segment_audio,
-                    language=language,
-                    verbose=None,
-                    fp16=False
-                )
-                logger.info(f"話者 {speaker} のセグメント {i}/{len(speaker_segments)} の文字起こしが完了しました")
-                
-                # 結果を追加
-                text = transcription_result['text'].strip()
+            # 最後の窓以外は、末尾で途切れている可能性のあるセグメントを次の窓に回す
+            is_last = finished and len(buffer) <= window
+            limit_s = len(chunk) / SAMPLE_RATE if is_last else (len(chunk) - margin) / SAMPLE_RATE
+            segments = result.get('segments', [])
+            ready = [segment for segment in segments if segment['end'] <= limit_s]
+            if not ready and segments:
+                # 窓全体にまたがるセグメントしかない場合はそのまま確定する
+                ready = segments
+            consumed_s = 0.0
+            texts = []
+            for segment in ready:
+                text = segment['text'].strip()
+                consumed_s = min(segment['end'], len(chunk) / SAMPLE_RATE)
                 if text:
-                    results.append({
-                        'speaker': speaker,
-                        'start_s': start_time_ms / 1000.0,
-                        'end_s': end_time_ms / 1000.0,
-                        'text': text
-                    })
-            except Exception as e:
-                logger.error(f"セグメント {i} の文字起こしに失敗しました: {e}")
+                    self._record(SegmentRecord(
+                        buffer_offset / SAMPLE_RATE + segment['start'],
+                        buffer_offset / SAMPLE_RATE + segment['end'],
+                        None,
+                        text,
+                        segment_confidence(segment)
+                    ))
+                    texts.append(text)
+                    committed += 1
+            if texts:
+                prompt = join_texts(texts)[-200:]
+            
+            if is_last:
+                break
+            # 確定した位置から次の窓を始める（確定できなかった場合は保留分を除いて進める）
+            consumed = int(consumed_s * SAMPLE_RATE) if consumed_s > 0 else len(chunk) - margin
+            buffer = buffer[consumed:]
+            buffer_offset += consumed
+            logger.info(f"{buffer_offset / SAMPLE_RATE:.1f}秒までの文字起こしが確定しました")
+            # 窓ごとに確定した位置を記録する（出力ファイルは確定分まで書き込み済み）
+            self._checkpoint_update(
+                force=True, offset_samples=buffer_offset, prompt=prompt, committed=committed, language=language
+            )
         
-        logger.info("話者別の文字起こしが完了しました")
+        self.run_info['audio_s'] = round((buffer_offset + len(buffer)) / SAMPLE_RATE, 3)
+        logger.info(f"ストリーミング文字起こしが完了しました（{committed} セグメント）")
+        return committed
+    
+    def _transcribe_full(
+        self,
+        audio: np.ndarray,
+        language: Optional[str],
+        word_timestamps: bool = False,
+        on_segments: Optional[Callable[[List[Dict]], None]] = None
+    ) -> Dict:
+        """音声全体を文字起こしする（キャッシュがあれば再利用する）
         
-        # 結果が空の場合は通常の文字起こしにフォールバック
-        if not results:
-            logger.warning("話者別文字起こしの結果が空のため、通常の文字起こしにフォールバックします")
-            return self.audio_processor.transcribe(file_path, language)
+        on_segmentsには確定したセグメントが先頭から順に渡される（窓ごとに処理する場合は窓ごと）
+        """
+        on_segments = on_segments or (lambda segments: None)
+        key = None
+        if self.cache and self._audio_hash:
+            model_key = f"{self._model_name}.int8" if self.config.quantize else self._model_name
+            key = self.cache.make_key(self._audio_hash, model_key, language or "auto", word_timestamps)
+            cached = self.cache.get("transcription", key)
+            if cached is not None:
+                logger.info("キャッシュされた文字起こし結果を使用します")
+                if cached.get('language'):
+                    self.run_info['language'] = cached['language']
+                on_segments(cached.get('segments', []))
+                return cached
         
-        # 結果を開始時間でソート
-        results.sort(key=lambda x: x['start_s'])
+        checkpoint_name = f"transcription_{int(word_timestamps)}"
+        saved = self._checkpoint_get(checkpoint_name)
+        if saved is not None:
+            logger.info("チェックポイントの文字起こし結果を使用します")
+            on_segments(saved.get('segments', []))
+            return saved
         
-        # 結果を整形して返す
-        return "\n".join(
-            f"話者 {r['speaker']} [{r['start_s']:.2f}s - {r['end_s']:.2f}s]: {r['text']}"
-            for r in results
-        )
-
-def check_ffmpeg() -> bool:
-    """FFmpegの存在を確認する"""
-    try:
-        result = subprocess.run(["ffmpeg", "-version"], capture_output=True, check=True)
-        logger.info("FFmpegが正常に動作します")
-        # FFmpegのバージョン情報を表示
-        version_line = result.stdout.split(b'\n')[0].decode('utf-8', errors='ignore') if result.stdout else "バージョン情報なし"
-        logger.info(f"FFmpeg version: {version_line}")
-        return True
-    except subprocess.CalledProcessError as e:
-        logger.error(f"FFmpegの実行に失敗しました: {e}")
-        return False
-    except Exception as e:
-        logger.error(f"FFmpegの確認中にエラーが発生しました: {e}")
-        return False
-
-def check_dependencies() -> bool:
-    """依存ライブラリの確認"""
-    try:
-        dependencies = [
-            ("pydub", "音声ファイルの読み込みと処理"),
-            ("whisper", "音声文字起こし"),
-            ("pyannote.audio", "話者分離")
-        ]
+        self._require_model()
+        windowed = self.checkpoint and len(audio) > self.config.chunk_seconds * SAMPLE_RATE
+        if windowed:
+            # 長い音声は窓ごとに文字起こしし、中断しても確定した位置から再開できるようにする
+            result = self._transcribe_windowed(
+                audio, language, word_timestamps, f"{checkpoint_name}_progress", on_segments
+            )
+        else:
+            with self.profiler.stage("transcription", len(audio) / SAMPLE_RATE):
+                result = self.audio_processor.transcribe_segments(audio, language, word_timestamps)
+        if result.get('language'):
+            self.run_info['language'] = result['language']
+        if key:
+            self.cache.put("transcription", key, compact_whisper_result(result))
+        self._checkpoint_update(force=True, **{checkpoint_name: compact_whisper_result(result)})
+        if not windowed:
+            on_segments(result.get('segments', []))
+        return result
+    
+    def _transcribe_windowed(
+        self,
+        audio: np.ndarray,
+        language: Optional[str],
+        word_timestamps: bool,
+        progress_name: str,
+        on_segments: Callable[[List[Dict]], None]
+    ) -> Dict:
+        """音声を重なりのある窓ごとに文字起こしし、確定した位置とセグメントをチェックポイントに記録する"""
+        window = int(self.config.chunk_seconds * SAMPLE_RATE)
+        margin = int(min(self.config.chunk_margin_seconds, self.config.chunk_seconds / 2) * SAMPLE_RATE)
+        # 窓ごとに言語を検出し直さないよう、最初に1回だけ検出して固定する
+        language = self._resolve_language(audio, language)
         
-        missing = []
-        for package, purpose in dependencies:
-            try:
-                __import__(package)
-                logger.info(f"{package} がインストールされています")
-            except ImportError:
-                missing.append(f"{package} ({purpose})")
+        progress = self._checkpoint_get(progress_name) or {}
+        offset = progress.get('offset_samples', 0)
+        segments = list(progress.get('segments', []))
+        prompt = progress.get('prompt')  # 前の窓の末尾のテキスト（デコーダの文脈として引き継ぐ）
+        if offset:
+            logger.info(f"{offset / SAMPLE_RATE:.1f}秒まで文字起こし済みのため、続きから再開します")
+            on_segments(segments)
         
-        if missing:
-            logger.error(f"以下のライブラリがインストールされていません: {', '.join(missing)}")
-            logger.error("pip install whisper pyannote.audio pydub soundfile numpy コマンドを実行してください")
-            return False
+        while offset < len(audio):
+            chunk = audio[offset:offset + window]
+            with self.profiler.stage("transcription", len(chunk) / SAMPLE_RATE):
+                result = self.audio_processor.transcribe_segments(chunk, language, word_timestamps, initial_prompt=prompt)
+            
+            # 最後の窓以外は、末尾で途切れている可能性のあるセグメントを次の窓に回す
+            is_last = offset + len(chunk) >= len(audio)
+            limit_s = len(chunk) / SAMPLE_RATE if is_last else (len(chunk) - margin) / SAMPLE_RATE
+            window_segments = result.get('segments', [])
+            ready = [segment for segment in window_segments if segment['end'] <= limit_s] or window_segments
+            consumed_s = 0.0
+            committed = []
+            for segment in ready:
+                consumed_s = min(segment['end'], len(chunk) / SAMPLE_RATE)
+                committed.append(compact_segment(shift_segment(segment, offset / SAMPLE_RATE)))
+            segments.extend(committed)
+            texts = [segment['text'].strip() for segment in ready if segment['text'].strip()]
+            if texts:
+                prompt = join_texts(texts)[-200:]
+            
+            # 確定した位置から次の窓を始める（確定できなかった場合は保留分を除いて進める）
+            if is_last:
+                offset = len(audio)
+            else:
+                offset += int(consumed_s * SAMPLE_RATE) if consumed_s > 0 else len(chunk) - margin
+            logger.info(f"{offset / SAMPLE_RATE:.1f}/{len(audio) / SAMPLE_RATE:.1f}秒までの文字起こしが確定しました")
+            # 出力に失敗しても文字起こし済みの窓をやり直さないよう、出力より先に記録する
+            self._checkpoint_update(
+                force=True, **{progress_name: {'offset_samples': offset, 'segments': list(segments), 'prompt': prompt}}
+            )
+            # 確定したセグメントは音声全体の処理を待たずに出力する
+            on_segments(committed)
         
-        return True
-    except Exception as e:
-        logger.error(f"依存関係の確認中にエラーが発生しました: {e}")
+        return {
+            'text': "".join(segment['text'] for segment in segments),
+            'language': language,
+            'segments': segments
+        }
+    
+    def _transcribe_text(self, audio: np.ndarray, language: Optional[str]) -> str:
+        """音声全体を文字起こししてテキストを返す"""
+        try:
+            return self._transcribe_full(audio, language, on_segments=self._emit_segments).get("text", "")
+        except Exception as e:
+            logger.error(f"文字起こしに失敗しました: {e}")
+            self.error = str(e)
+            return ""
+    
+    def _diarize(self, audio: np.ndarray) -> List[Dict]:
+        """話者分離を行う（キャッシュがあれば再利用する）"""
+        # 話者の同定を行う場合は、埋め込みを含まない結果は使わない
+        need_embeddings = self.speaker_index is not None
+        self._speaker_embeddings = {}
+        key = None
+        if self.cache and self._audio_hash:
+            key = self.cache.make_key(self._audio_hash, os.path.abspath(self.config.config_file))
+            cached = self.cache.get("diarization", key)
+            if cached is not None and (not need_embeddings or 'embeddings' in cached):
+                logger.info("キャッシュされた話者分離結果を使用します")
+                self._speaker_embeddings = cached.get('embeddings', {})
+                return cached['turns']
+        
+        saved = self._checkpoint_get('turns')
+        saved_embeddings = self._checkpoint_get('speaker_embeddings')
+        if saved is not None and (not need_embeddings or saved_embeddings is not None):
+            logger.info("チェックポイントの話者分離結果を使用します")
+            self._speaker_embeddings = saved_embeddings or {}
+            return saved
+        
+        with self.profiler.stage("diarization", len(audio) / SAMPLE_RATE):
+            if need_embeddings:
+                speaker_segments, self._speaker_embeddings = self.audio_processor.diarize_speakers(
+                    audio, return_embeddings=True
+                )
+            else:
+                speaker_segments = self.audio_processor.diarize_speakers(audio)
+        entry = {'turns': speaker_segments}
+        if need_embeddings:
+            entry['embeddings'] = self._speaker_embeddings
+        if key and speaker_segments:
+            self.cache.put("diarization", key, entry)
+        if speaker_segments:
+            self._checkpoint_update(force=True, turns=speaker_segments, speaker_embeddings=entry.get('embeddings'))
+        return speaker_segments
+    
+    def _identify_speakers(self, speaker_segments: List[Dict]) -> List[Dict]:
+        """ファイル内の話者ラベルを、話者の索引で同定した既知の話者の名前に置き換える"""
+        if not self.speaker_index or not self._speaker_embeddings:
+            return speaker_segments
+        try:
+            mapping = self.speaker_index.identify(self._speaker_embeddings, self._audio_hash)
+        except Exception as e:
+            # ロックの待ち時間切れや索引の保存失敗などでは、ファイル内の話者ラベルのまま出力する
+            logger.warning(f"話者の索引を使用できないため、話者の同定を行いません: {e}")
+            return speaker_segments
+        self.run_info['speakers'] = mapping
+        logger.info("話者を同定しました: " + ", ".join(f"{label} -> {name}" for label, name in sorted(mapping.items())))
+        return [dict(segment, speaker=mapping.get(segment['speaker'], segment['speaker'])) for segment in speaker_segments]
+    
+    def process_file(
+        self,
+        file_path: str,
+        model_name: str = "base",
+        language: Optional[str] = None,
+        diarize: bool = False,
+        output_file: Optional[str] = None,
+        output_dir: str = "output"
+    ) -> Dict:
+        """1ファイルを文字起こしして保存し、処理結果とタイミングを返す"""
+        start = time.perf_counter()
+        result = {
+            'file': file_path,
+            'output_file': None,
+            'transcribed': False,
+            'success': False,
+            'elapsed_s': 0.0,
+            'error': None
+        }
+        
+        if not os.path.exists(file_path):
+            logger.error(f"ファイル '{file_path}' が見つかりません")
+            result['error'] = "ファイルが見つかりません"
+            return result
+        
+        if self.config.use_checkpoint:
+            options = {
+                'model': model_name,
+                'language': language,
+                'diarize': diarize,
+                'diarize_mode': self.config.diarize_mode,
+                'pack_seconds': self.config.pack_seconds,
+                'batch_size': self.config.batch_size,
+                'word_timestamps': self.config.word_timestamps,
+                'stream': self.config.stream,
+                'chunk_seconds': self.config.chunk_seconds,
+                'vad': self.config.vad,
+                'vad_threshold_db': self.config.vad_threshold_db,
+                'output_format': self.config.output_format,
+                'quantize': self.config.quantize,
+                'speaker_index': self.config.speaker_index
+            }
+            self.checkpoint = Checkpoint.for_job(
+                self.config.checkpoint_dir, file_path, options, self.config.checkpoint_interval
+            )
+        self.run_info = {}
+        self.profiler = StageProfiler()
+        try:
+            result = self._process_file(file_path, model_name, language, diarize, output_file, output_dir, result)
+            result.update(self.run_info)
+            if self.config.profile and result['output_file']:
+                result['profile_file'] = self._write_profile(result)
+            if result['success'] and self.checkpoint:
+                self.checkpoint.clear()
+        finally:
+            self.checkpoint = None
+        
+        result['elapsed_s'] = round(time.perf_counter() - start, 3)
+        return result
+    
+    def _write_profile(self, result: Dict) -> Optional[str]:
+        """段階ごとの計測結果を出力ファイルの隣にJSONで保存する"""
+        profile_file = f"{os.path.splitext(result['output_file'])[0]}.profile.json"
+        report = self.profiler.report(self.run_info.get('audio_s'))
+        report['file'] = result['file']
+        report['run_info'] = dict(self.run_info)
+        try:
+            with open(profile_file, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            logger.info(f"計測結果が {profile_file} に保存されました")
+            return profile_file
+        except Exception as e:
+            logger.error(f"計測結果の保存に失敗しました: {e}")
+            return None
+    
+    def _process_file(
+        self,
+        file_path: str,
+        model_name: str,
+        language: Optional[str],
+        diarize: bool,
+        output_file: Optional[str],
+        output_dir: str,
+        result: Dict
+    ) -> Dict:
+        """文字起こしと保存を行い、結果を記録する"""
+        if self.config.vad and self.config.stream:
+            logger.warning("ストリーミングモードでは音声区間検出は使用されません")
+        writer_class = SEGMENT_WRITERS[self.config.output_format]
+        if self.config.stream:
+            # 再開時は前回の出力ファイルに追記する
+            resume_output = self._checkpoint_get('output_file')
+            resuming = bool(resume_output and self._checkpoint_get('offset_samples'))
+            if resuming:
+                output_file = resume_output
+            elif not output_file:
+                output_file = build_output_path(file_path, output_dir, writer_class.extension)
+            self._checkpoint_update(force=True, output_file=output_file)
+            # 呼び出し元が設定したコールバックにも引き続きセグメントを渡す
+            previous_callback = self.on_record
+            try:
+                start_index = self._checkpoint_get('committed', 0) + 1 if resuming else 1
+                with open_segment_writer(output_file, self.config.output_format, resuming, start_index) as writer:
+                    def on_record(record: SegmentRecord):
+                        writer.write(record)
+                        if previous_callback:
+                            previous_callback(record)
+                    self.on_record = on_record
+                    count = self.transcribe_stream(file_path, model_name, language)
+                if count:
+                    result['transcribed'] = True
+                    result['success'] = True
+                    result['output_file'] = output_file
+                    logger.info(f"結果が {output_file} に保存されました")
+                else:
+                    result['error'] = "文字起こし結果が空です"
+            except Exception as e:
+                logger.error(f"ストリーミング文字起こしに失敗しました: {e}", exc_info=True)
+                result['error'] = str(e)
+            finally:
+                self.on_record = previous_callback
+            return result
+        
+        if self.config.output_format != "txt":
+            return self._process_file_incrementally(file_path, model_name, language, diarize, output_file, output_dir, result)
+        
+        transcription_text = self.transcribe_audio(
+            file_path=file_path,
+            model_name=model_name,
+            language=language,
+            diarize=diarize
+        )
+        
+        if transcription_text:
+            result['transcribed'] = True
+            if not output_file:
+                output_file = build_output_path(file_path, output_dir)
+            with self.profiler.stage("save"):
+                saved = save_transcription(transcription_text, output_file, output_dir)
+            if saved:
+                result['output_file'] = output_file
+                result['success'] = True
+            else:
+                # 保存に失敗した場合は標準出力に表示
+                print("文字起こし結果:")
+                print(transcription_text)
+                result['error'] = "結果の保存に失敗しました"
+        else:
+            logger.error("文字起こし結果が空です")
+            result['error'] = "文字起こし結果が空です"
+        return result
+    
+    def _process_file_incrementally(
+        self,
+        file_path: str,
+        model_name: str,
+        language: Optional[str],
+        diarize: bool,
+        output_file: Optional[str],
+        output_dir: str,
+        result: Dict
+    ) -> Dict:
+        """確定したセグメントから順に、指定の出力形式でファイルに追記する"""
+        if not output_file:
+            output_file = build_output_path(file_path, output_dir, SEGMENT_WRITERS[self.config.output_format].extension)
+        # 呼び出し元が設定したコールバックにも引き続きセグメントを渡す
+        previous_callback = self.on_record
+        try:
+            with open_segment_writer(output_file, self.config.output_format) as writer:
+                def on_record(record: SegmentRecord):
+                    writer.write(record)
+                    if previous_callback:
+                        previous_callback(record)
+                self.on_record = on_record
+                self.transcribe_audio(file_path=file_path, model_name=model_name, language=language, diarize=diarize)
+            if self.error:
+                # 途中まで書き込んだ出力は残し、チェックポイントから再開できるよう失敗として扱う
+                result['error'] = f"文字起こし処理中にエラーが発生しました: {self.error}"
+                return result
+        except Exception as e:
+            logger.error(f"結果の保存に失敗しました: {e}")
+            result['error'] = "結果の保存に失敗しました"
+            return result
+        finally:
+            self.on_record = previous_callback
+        
+        if self.records:
+            result['transcribed'] = True
+            result['success'] = True
+            result['output_file'] = output_file
+            logger.info(f"結果が {output_file} に保存されました")
+        else:
+            logger.error("文字起こし結果が空です")
+            result['error'] = "文字起こし結果が空です"
+            os.remove(output_file)
+        return result
+    
+    def transcribe_batch(
+        self,
+        file_paths: Iterable[str],
+        model_name: str = "base",
+        language: Optional[str] = None,
+        diarize: bool = False,
+        output_dir: str = "output"
+    ) -> List[Dict]:
+        """複数の音声ファイルを、読み込み済みのモデルを使い回して順に処理する"""
+        results = []
+        for i, file_path in enumerate(file_paths, 1):
+            logger.info(f"[{i}] '{file_path}' の処理を開始します...")
+            result = self.process_file(
+                file_path=file_path,
+                model_name=model_name,
+                language=language,
+                diarize=diarize,
+                output_dir=output_dir
+            )
+            status = "成功" if result['success'] else f"失敗 ({result['error']})"
+            logger.info(f"[{i}] '{file_path}' の処理が終了しました: {status}, {result['elapsed_s']:.2f}秒")
+            results.append(result)
+        return results
+    
+    def _transcribe_with_diarization(self, audio: np.ndarray, language: Optional[str]) -> str:
+        """話者分離付き文字起こしを実行"""
+        transcription_result = None
+        if self.config.diarize_mode == "overlap" and self.config.parallel_diarization:
+            speaker_segments, transcription_result = self._diarize_and_transcribe_concurrently(audio, language)
+        else:
+            logger.info("話者分離を開始します...")
+            speaker_segments = self._diarize(audio)
+            logger.info("話者分離が完了しました")
+        
+        if not speaker_segments:
+            logger.warning("話者分離に失敗したため、通常の文字起こしにフォールバックします")
+            if transcription_result is not None:
+                return self._emit_whisper_segments(transcription_result)
+            return self._transcribe_text(audio, language)
+        
+        speaker_segments = self._identify_speakers(speaker_segments)
+        if self.config.diarize_mode == "segment":
+            results = self.transcribe_turns(audio, language, speaker_segments)
+        else:
+            results = self._transcribe_by_overlap(audio, language, speaker_segments, transcription_result)
+        
+        # 結果が空の場合は通常の文字起こしにフォールバック
+        if not results:
+            logger.warning("話者別文字起こしの結果が空のため、通常の文字起こしにフォールバックします")
+            return self._transcribe_text(audio, language)
+        
+        if self.timeline:
+            # 無音を除いた音声上の時刻を元の音声の時刻に戻す
+            for r in results:
+                r['start_s'] = self.timeline.to_original(r['start_s'])
+                r['end_s'] = self.timeline.end_to_original(r['end_s'])
+        
+        return format_diarized_results(results)
+    
+    def _diarize_and_transcribe_concurrently(
+        self,
+        audio: np.ndarray,
+        language: Optional[str]
+    ) -> Tuple[List[Dict], Optional[Dict]]:
+        """同じ音声データに対して話者分離と全体の文字起こしを並行して実行する"""
+        whisper_threads, diarize_threads = split_thread_budget(
+            self.config.whisper_threads, self.config.diarize_threads
+        )
+        logger.info(f"話者分離と文字起こしを並行して実行します"
+                    f"（スレッド数: 文字起こし {whisper_threads}, 話者分離 {diarize_threads}）")
+        
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            diarize_future = executor.submit(
+                run_with_thread_budget, diarize_threads,
+                self._diarize, audio
+            )
+            transcribe_future = executor.submit(
+                run_with_thread_budget, whisper_threads,
+                self._transcribe_full, audio, language, self.config.word_timestamps
+            )
+            
+            speaker_segments = diarize_future.result()
+            logger.info("話者分離が完了しました")
+            try:
+                transcription_result = transcribe_future.result()
+                logger.info("音声全体の文字起こしが完了しました")
+            except Exception as e:
+                logger.error(f"文字起こしに失敗しました: {e}")
+                transcription_result = None
+        
+        return speaker_segments, transcription_result
+    
+    def _transcribe_by_overlap(
+        self,
+        audio: np.ndarray,
+        language: Optional[str],
+        speaker_segments: List[Dict],
+        transcription_result: Optional[Dict] = None
+    ) -> List[Dict]:
+        """音声全体を1回で文字起こしし、話者区間との重なりから話者を割り当てる"""
+        assigner = SpeakerAssigner(speaker_segments, merge_gap_s=self.config.merge_gap_s)
+        results = []
+        
+        def emit(utterances: List[Dict]):
+            for r in utterances:
+                results.append(r)
+                self._emit(r['start_s'], r['end_s'], r['text'], r['speaker'], r.get('confidence'))
+        
+        def on_segments(segments: List[Dict]):
+            with self.profiler.stage("merge"):
+                utterances = assigner.add(segments)
+            emit(utterances)
+        
+        if transcription_result is None:
+            # 話者区間は先に求めてあるため、文字起こしの窓が確定するたびに話者を割り当てて出力する
+            logger.info("音声全体の文字起こしと話者の割り当てを開始します...")
+            try:
+                self._transcribe_full(
+                    audio, language, word_timestamps=self.config.word_timestamps, on_segments=on_segments
+                )
+            except Exception as e:
+                logger.error(f"文字起こしに失敗しました: {e}")
+                if results:
+                    # 途中まで出力済みの場合は、通常の文字起こしに切り替えず失敗として扱う
+                    raise
+                return []
+            logger.info("音声全体の文字起こしが完了しました")
+        else:
+            logger.info("時刻の重なりによる話者の割り当てを開始します...")
+            on_segments(transcription_result.get('segments', []))
+        emit(assigner.flush())
+        logger.info(f"話者の割り当てが完了しました（{len(results)} 発話）")
+        return results
+    
+    def transcribe_turns(
+        self,
+        audio: np.ndarray,
+        language: Optional[str],
+        speaker_segments: List[Dict]
+    ) -> List[Dict]:
+        """話者区間ごとに音声を切り出して文字起こしする"""
+        self._require_model()
+        # 短い区間ごとに言語を検出し直さないよう、音声全体から1回だけ検出して固定する
+        language = self._resolve_language(audio, language)
+        logger.info("話者別の文字起こしを開始します...")
+        
+        # 重なりを解消し、同一話者の区間や短い区間をまとめてWhisperの呼び出し回数を減らす
+        with self.profiler.stage("segment_planning"):
+            planned = plan_segments(
+                speaker_segments,
+                merge_gap_s=self.config.merge_gap_s,
+                pack_seconds=self.config.pack_seconds,
+                pack_gap_s=self.config.pack_gap_s,
+                min_turn_s=self.config.min_turn_s
+            )
+        
+        # 文字起こし対象の窓を切り出す
+        windows = []
+        clips = []
+        for window in planned:
+            # 窓の開始・終了時間をサンプル数に変換
+            start_sample = int(window['start'] * SAMPLE_RATE // 1000)
+            end_sample = int(window['end'] * SAMPLE_RATE // 1000)
+            if start_sample >= len(audio) or end_sample > len(audio):
+                logger.warning(f"セグメント範囲が音声データの範囲外です: {start_sample}:{end_sample}, len={len(audio)}")
+                continue
+            windows.append(window)
+            clips.append(audio[start_sample:end_sample])
+        
+        self.run_info['segment_plan'] = {
+            'turns': len(speaker_segments),
+            'calls': len(windows),
+            'multi_speaker_windows': sum(1 for w in windows if is_multi_speaker(w))
+        }
+        logger.info(f"話者区間 {len(speaker_segments)} 件を {len(windows)} 回の文字起こしにまとめました")
+        
+        # チェックポイントがあれば処理済みの窓から再開する
+        results = list(self._checkpoint_get('turn_results', []))
+        done = self._checkpoint_get('turns_done', 0)
+        if done:
+            logger.info(f"区間 {done}/{len(clips)} まで処理済みのため、続きから再開します")
+        for r in results:
+            self._emit(r['start_s'], r['end_s'], r['text'], r['speaker'], r.get('confidence'))
+        
+        decoder = None
+        if self.config.batch_size > 1:
+            decoder = BatchSegmentDecoder(self.audio_processor.model, language, self.config.batch_size)
+        # 途中経過を記録できるよう、いくつかのバッチ単位で処理する
+        group_size = max(1, self.config.batch_size) * 4
+        for group_start in range(done, len(clips), group_size):
+            group_clips = clips[group_start:group_start + group_size]
+            group_windows = windows[group_start:group_start + group_size]
+            group_audio_s = sum(len(clip) for clip in group_clips) / SAMPLE_RATE
+            with self.profiler.stage("segment_transcription", group_audio_s):
+                group_results = self._transcribe_windows(group_clips, group_windows, language, decoder)
+            
+            for window_results in group_results:
+                for r in window_results:
+                    results.append(r)
+                    self._emit(r['start_s'], r['end_s'], r['text'], r['speaker'], r.get('confidence'))
+            self._checkpoint_update(
+                turns_done=group_start + len(group_clips),
+                turn_results=results,
+                offset_s=group_windows[-1]['end'] / 1000.0
+            )
+        
+        logger.info("話者別の文字起こしが完了しました")
+        return results
+    
+    def _transcribe_windows(
+        self,
+        clips: List[np.ndarray],
+        windows: List[Dict],
+        language: Optional[str],
+        decoder: Optional['BatchSegmentDecoder'] = None
+    ) -> List[List[Dict]]:
+        """窓ごとに文字起こしし、窓ごとの話者別の発話を返す"""
+        window_results = [[] for _ in windows]
+        
+        # 話者が1人の窓はテキストだけを求めればよいため、まとめてバッチでデコードする
+        single = [i for i, window in enumerate(windows) if not is_multi_speaker(window)]
+        single_clips = [clips[i] for i in single]
+        single_windows = [windows[i] for i in single]
+        if decoder:
+            texts = decoder.decode(single_clips)
+        else:
+            texts = self._transcribe_clips_sequentially(single_clips, single_windows, language)
+        for i, text in zip(single, texts):
+            if text:
+                window_results[i].append({
+                    'speaker': windows[i]['turns'][0]['speaker'],
+                    'start_s': windows[i]['start'] / 1000.0,
+                    'end_s': windows[i]['end'] / 1000.0,
+                    'text': text
+                })
+        
+        # 複数の話者を含む窓はタイムスタンプから窓内の話者区間に振り分ける
+        # （バッチではセグメント単位、バッチにできなかった窓は単語単位のタイムスタンプを使う）
+        multi = [i for i, window in enumerate(windows) if is_multi_speaker(window)]
+        decoded = decoder.decode_segments([clips[i] for i in multi]) if decoder else [None] * len(multi)
+        for i, segments in zip(multi, decoded):
+            if segments is None:
+                window_results[i] = self._transcribe_packed_window(clips[i], windows[i], language)
+            else:
+                window_results[i] = self._assign_window_speakers(segments, windows[i])
+        return window_results
+    
+    def _transcribe_packed_window(
+        self,
+        clip: np.ndarray,
+        window: Dict,
+        language: Optional[str]
+    ) -> List[Dict]:
+        """複数の話者区間をまとめた窓を文字起こしし、話者ごとの発話に分ける"""
+        speakers = ", ".join(dict.fromkeys(turn['speaker'] for turn in window['turns']))
+        logger.info(f"話者 {speakers} の {len(window['turns'])} 区間をまとめて文字起こしします...")
+        try:
+            result = self.audio_processor.transcribe_segments(clip, language, word_timestamps=True)
+        except Exception as e:
+            logger.error(f"まとめた区間の文字起こしに失敗しました: {e}")
+            return []
+        
+        return self._assign_window_speakers(result.get('segments', []), window)
+    
+    def _assign_window_speakers(self, segments: List[Dict], window: Dict) -> List[Dict]:
+        """窓内の時刻を音声全体の時刻に直してから、窓内の話者区間に話者を割り当てる"""
+        offset_s = window['start'] / 1000.0
+        segments = [shift_segment(segment, offset_s) for segment in segments]
+        return assign_speakers(segments, window['turns'], merge_gap_s=self.config.merge_gap_s)
+    
+    def _transcribe_clips_sequentially(
+        self,
+        clips: List[np.ndarray],
+        windows: List[Dict],
+        language: Optional[str]
+    ) -> List[str]:
+        """切り出した区間を1つずつ文字起こしする"""
+        texts = []
+        for i, (segment_audio, window) in enumerate(zip(clips, windows), 1):
+            speaker = window['turns'][0]['speaker']
+            logger.info(f"話者 {speaker} のセグメント {i}/{len(clips)} の文字起こしを開始します...")
+            try:
+                transcription_result = self.audio_processor.model.transcribe(
+                    segment_audio,
+                    language=language,
+                    verbose=None,
+                    fp16=False
+                )
+                logger.info(f"話者 {speaker} のセグメント {i}/{len(clips)} の文字起こしが完了しました")
+                texts.append(transcription_result['text'].strip())
+            except Exception as e:
+                logger.error(f"セグメント {i} の文字起こしに失敗しました: {e}")
+                texts.append("")
+        return texts
+
+class BatchSegmentDecoder:
+    """複数の話者区間をまとめてWhisperのエンコーダ・デコーダに通すクラス"""
+    
+    # Whisperの通常の文字起こしと同じ品質判定のしきい値
+    COMPRESSION_RATIO_THRESHOLD = 2.4
+    LOGPROB_THRESHOLD = -1.0
+    NO_SPEECH_THRESHOLD = 0.6
+    
+    def __init__(self, model, language: Optional[str], batch_size: int = 8):
+        self.model = model
+        self.language = language
+        self.batch_size = max(1, batch_size)
+        self.window_samples = 30 * SAMPLE_RATE  # Whisperの入力窓（30秒）
+    
+    def decode(self, clips: List[np.ndarray]) -> List[str]:
+        """区間ごとの音声をバッチでデコードし、区間ごとのテキストを返す"""
+        texts = [""] * len(clips)
+        # 30秒を超える区間を固定位置で切るとまたがる単語が欠けるため、
+        # 文脈を引き継いで窓を進める通常の文字起こしで処理し、1つの窓に収まる区間だけをバッチにする
+        batchable = [i for i, clip in enumerate(clips) if len(clip) <= self.window_samples]
+        retry = [i for i, clip in enumerate(clips) if len(clip) > self.window_samples]
+        for batch_start in range(0, len(batchable), self.batch_size):
+            batch = batchable[batch_start:batch_start + self.batch_size]
+            logger.info(f"区間 {batch_start + 1}-{batch_start + len(batch)}/{len(batchable)} をバッチでデコードします...")
+            try:
+                decoded = self._decode_batch([clips[i] for i in batch])
+            except Exception as e:
+                logger.error(f"バッチデコードに失敗したため、逐次処理で再試行します: {e}")
+                retry.extend(batch)
+                continue
+            for index, result in zip(batch, decoded):
+                if (result.no_speech_prob > self.NO_SPEECH_THRESHOLD
+                        and result.avg_logprob < self.LOGPROB_THRESHOLD):
+                    continue  # 無音と判定
+                if (result.compression_ratio > self.COMPRESSION_RATIO_THRESHOLD
+                        or result.avg_logprob < self.LOGPROB_THRESHOLD):
+                    retry.append(index)  # 貪欲法で品質が不十分な区間は温度フォールバック付きで再処理
+                    continue
+                texts[index] = result.text.strip()
+        
+        if retry:
+            logger.info(f"{len(retry)} 区間を通常の文字起こしで処理します...")
+        for index in sorted(retry):
+            try:
+                result = self.model.transcribe(
+                    clips[index],
+                    language=self.language,
+                    verbose=None,
+                    fp16=False
+                )
+                texts[index] = result['text'].strip()
+            except Exception as e:
+                logger.error(f"区間 {index + 1} の文字起こしに失敗しました: {e}")
+        return texts
+    
+    def decode_segments(self, clips: List[np.ndarray]) -> List[Optional[List[Dict]]]:
+        """1つの窓に収まる区間をタイムスタンプ付きでバッチデコードし、区間ごとのセグメントを返す"""
+        # デコードに失敗した区間・品質が不十分な区間はNoneとし、呼び出し元で通常の文字起こしに回す
+        segments = [None] * len(clips)
+        batchable = [i for i, clip in enumerate(clips) if len(clip) <= self.window_samples]
+        tokenizer = None
+        for batch_start in range(0, len(batchable), self.batch_size):
+            batch = batchable[batch_start:batch_start + self.batch_size]
+            logger.info(f"複数話者の区間 {batch_start + 1}-{batch_start + len(batch)}/{len(batchable)} を"
+                        f"タイムスタンプ付きでバッチデコードします...")
+            try:
+                decoded = self._decode_batch([clips[i] for i in batch], without_timestamps=False)
+                tokenizer = tokenizer or self._tokenizer()
+            except Exception as e:
+                logger.error(f"タイムスタンプ付きのバッチデコードに失敗したため、逐次処理で再試行します: {e}")
+                continue
+            for index, result in zip(batch, decoded):
+                if (result.no_speech_prob > self.NO_SPEECH_THRESHOLD
+                        and result.avg_logprob < self.LOGPROB_THRESHOLD):
+                    segments[index] = []  # 無音と判定
+                    continue
+                if (result.compression_ratio > self.COMPRESSION_RATIO_THRESHOLD
+                        or result.avg_logprob < self.LOGPROB_THRESHOLD):
+                    continue
+                segments[index] = segments_from_tokens(
+                    result.tokens, tokenizer.timestamp_begin, tokenizer.decode,
+                    len(clips[index]) / SAMPLE_RATE, avg_logprob=result.avg_logprob
+                )
+        return segments
+    
+    def _tokenizer(self):
+        """デコード結果のトークン列を読むためのトークナイザ"""
+        from whisper.tokenizer import get_tokenizer
+        return get_tokenizer(
+            self.model.is_multilingual,
+            num_languages=self.model.num_languages,
+            language=self.language,
+            task="transcribe"
+        )
+    
+    def _decode_batch(self, batch: List[np.ndarray], without_timestamps: bool = True) -> List:
+        """30秒にパディングしたメルスペクトログラムをまとめてデコードする"""
+        import torch
+        import whisper
+        
+        n_mels = self.model.dims.n_mels
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(piece), n_mels=n_mels)
+            for piece in batch
+        ]).to(self.model.device)
+        options = whisper.DecodingOptions(
+            language=self.language,
+            without_timestamps=without_timestamps,
+            fp16=False
+        )
+        return whisper.decode(self.model, mel, options)
+
+def segments_from_tokens(
+    tokens: List[int],
+    timestamp_begin: int,
+    decode: Callable[[List[int]], str],
+    duration_s: float,
+    time_precision: float = 0.02,
+    avg_logprob: Optional[float] = None
+) -> List[Dict]:
+    """タイムスタンプ付きでデコードしたトークン列を、Whisperのセグメントと同じ形式に変換する"""
+    segments = []
+    start_s = 0.0
+    text_tokens = []
+    
+    def close(end_s: float):
+        text = decode(text_tokens)
+        if text.strip():
+            segments.append({
+                'start': min(start_s, duration_s),
+                'end': min(max(end_s, start_s), duration_s),
+                'text': text,
+                'avg_logprob': avg_logprob
+            })
+    
+    # <|開始|> テキスト <|終了|> の並びを1セグメントとする
+    for token in tokens:
+        if token >= timestamp_begin:
+            time_s = (token - timestamp_begin) * time_precision
+            if text_tokens:
+                close(time_s)
+                text_tokens = []
+            start_s = time_s
+        else:
+            text_tokens.append(token)
+    if text_tokens:
+        # 終了のタイムスタンプがないまま終わった場合は区間の終わりまでとする
+        close(duration_s)
+    return segments
+
+class TurnIndex:
+    """話者区間（ミリ秒）に対する区間検索用インデックス"""
+    
+    def __init__(self, speaker_segments: List[Dict]):
+        turns = sorted(speaker_segments, key=lambda seg: seg['start'])
+        self.starts = [seg['start'] for seg in turns]
+        self.ends = [seg['end'] for seg in turns]
+        self.speakers = [seg['speaker'] for seg in turns]
+        # 先頭からi番目までの区間の終了時刻の最大値（後方探索の打ち切りに使う）
+        self.max_ends = []
+        max_end = float('-inf')
+        for end in self.ends:
+            max_end = max(max_end, end)
+            self.max_ends.append(max_end)
+    
+    def overlaps(self, start_ms: float, end_ms: float) -> Dict[str, float]:
+        """指定区間と重なる話者ごとの重なり時間（ミリ秒）を返す"""
+        totals = {}
+        i = bisect.bisect_left(self.starts, end_ms) - 1
+        while i >= 0 and self.max_ends[i] > start_ms:
+            overlap = min(end_ms, self.ends[i]) - max(start_ms, self.starts[i])
+            if overlap > 0:
+                totals[self.speakers[i]] = totals.get(self.speakers[i], 0.0) + overlap
+            i -= 1
+        return totals
+    
+    def nearest(self, time_ms: float) -> Optional[str]:
+        """指定時刻に最も近い話者区間の話者を返す"""
+        if not self.starts:
+            return None
+        i = bisect.bisect_left(self.starts, time_ms)
+        candidates = [j for j in (i - 1, i) if 0 <= j < len(self.starts)]
+        best = min(
+            candidates,
+            key=lambda j: max(self.starts[j] - time_ms, time_ms - self.ends[j], 0)
+        )
+        return self.speakers[best]
+    
+    def speaker_for(self, start_ms: float, end_ms: float) -> Optional[str]:
+        """指定区間と最も長く重なる話者を返す（重なりがなければ最も近い話者）"""
+        totals = self.overlaps(start_ms, end_ms)
+        if totals:
+            return max(totals, key=totals.get)
+        return self.nearest((start_ms + end_ms) / 2)
+
+class SpeakerAssigner:
+    """Whisperのセグメントを順に受け取り、話者を割り当てた発話を確定したものから返す"""
+    
+    def __init__(self, speaker_segments: List[Dict], merge_gap_s: float = 1.0):
+        self.index = TurnIndex(speaker_segments)
+        self.merge_gap_s = merge_gap_s
+        self.pending = None  # 次のセグメントと同じ発話にまとめられる可能性のある最後の発話
+    
+    def add(self, whisper_segments: List[Dict]) -> List[Dict]:
+        """セグメント（単語タイムスタンプがあれば単語）に話者を割り当て、確定した発話を返す"""
+        done = []
+        for segment in whisper_segments:
+            words = segment.get('words')
+            units = words if words else [{
+                'start': segment['start'],
+                'end': segment['end'],
+                'word': segment['text']
+            }]
+            fallback_confidence = segment_confidence(dict(segment, words=None))
+            for unit in units:
+                piece = {
+                    'speaker': self.index.speaker_for(unit['start'] * 1000, unit['end'] * 1000),
+                    'start_s': unit['start'],
+                    'end_s': unit['end'],
+                    'text': unit['word'],
+                    'confidences': [unit.get('probability', fallback_confidence)]
+                }
+                # 同一話者の連続した断片を1つの発話にまとめる
+                previous = self.pending
+                if (previous and previous['speaker'] == piece['speaker']
+                        and piece['start_s'] - previous['end_s'] <= self.merge_gap_s):
+                    previous['end_s'] = max(previous['end_s'], piece['end_s'])
+                    previous['text'] += piece['text']
+                    previous['confidences'] += piece['confidences']
+                else:
+                    if previous:
+                        done.append(previous)
+                    self.pending = piece
+        return self._finish(done)
+    
+    def flush(self) -> List[Dict]:
+        """保留していた最後の発話を確定して返す"""
+        done = [self.pending] if self.pending else []
+        self.pending = None
+        return self._finish(done)
+    
+    @staticmethod
+    def _finish(utterances: List[Dict]) -> List[Dict]:
+        for utterance in utterances:
+            utterance['text'] = utterance['text'].strip()
+            # 発話の信頼度は構成する断片の信頼度の平均とする
+            confidences = [c for c in utterance.pop('confidences') if c is not None]
+            utterance['confidence'] = round(sum(confidences) / len(confidences), 3) if confidences else None
+        return [u for u in utterances if u['text']]
+
+def assign_speakers(
+    whisper_segments: List[Dict],
+    speaker_segments: List[Dict],
+    merge_gap_s: float = 1.0
+) -> List[Dict]:
+    """Whisperのセグメント（単語タイムスタンプがあれば単語）に話者を割り当てる"""
+    assigner = SpeakerAssigner(speaker_segments, merge_gap_s)
+    return assigner.add(whisper_segments) + assigner.flush()
+
+def resolve_overlapping_turns(speaker_segments: List[Dict]) -> List[Dict]:
+    """重なり合う話者区間を、同じ音声が1つの区間にしか含まれないように切り分ける"""
+    turns = sorted(
+        (seg for seg in speaker_segments if seg['end'] > seg['start']),
+        key=lambda seg: (seg['start'], seg['end'])
+    )
+    boundaries = sorted({seg['start'] for seg in turns} | {seg['end'] for seg in turns})
+    
+    # 境界時刻で区切った小区間ごとに、その時点で最も遅く始まった話者（割り込んだ側）を割り当てる
+    resolved = []
+    active = []
+    next_turn = 0
+    for left, right in zip(boundaries, boundaries[1:]):
+        while next_turn < len(turns) and turns[next_turn]['start'] <= left:
+            active.append(turns[next_turn])
+            next_turn += 1
+        active = [seg for seg in active if seg['end'] > left]
+        if not active:
+            continue
+        speaker = active[-1]['speaker']
+        previous = resolved[-1] if resolved else None
+        if previous and previous['speaker'] == speaker and previous['end'] == left:
+            previous['end'] = right
+        else:
+            resolved.append({'start': left, 'end': right, 'speaker': speaker})
+    return resolved
+
+def is_multi_speaker(window: Dict) -> bool:
+    """窓に複数の話者の区間が含まれているかを返す"""
+    return len({turn['speaker'] for turn in window['turns']}) > 1
+
+def plan_segments(
+    speaker_segments: List[Dict],
+    merge_gap_s: float = 1.0,
+    pack_seconds: float = 30.0,
+    pack_gap_s: float = 2.0,
+    min_turn_s: float = 0.1,
+    mix_speakers: bool = True
+) -> List[Dict]:
+    """話者区間を整理し、Whisperに1回で渡す窓（ミリ秒）の一覧を作る"""
+    turns = resolve_overlapping_turns(speaker_segments)
+    # まとめた窓がWhisperの入力窓（30秒）に収まるよう、窓の長さの上限を決める
+    max_window_ms = min(pack_seconds, 30.0) * 1000 if pack_seconds > 0 else 30000
+    
+    # 短い間隔で続く同一話者の区間を1つにまとめる（まとめると窓の上限を超える場合はまとめない）
+    merged = []
+    for turn in turns:
+        previous = merged[-1] if merged else None
+        if (previous and previous['speaker'] == turn['speaker']
+                and turn['start'] - previous['end'] <= merge_gap_s * 1000
+                and turn['end'] - previous['start'] <= max_window_ms):
+            previous['end'] = turn['end']
+        else:
+            merged.append(dict(turn))
+    
+    # 連続する区間を窓の最大長まで詰め込む（窓内の話者ごとの区間は残す）
+    # mix_speakersが偽なら同じ話者の区間だけをまとめる
+    windows = []
+    for turn in merged:
+        window = windows[-1] if windows else None
+        if (window and pack_seconds > 0
+                and (mix_speakers or window['turns'][0]['speaker'] == turn['speaker'])
+                and turn['end'] - window['start'] <= max_window_ms
+                and turn['start'] - window['end'] <= pack_gap_s * 1000):
+            window['end'] = turn['end']
+            window['turns'].append(turn)
+        else:
+            windows.append({'start': turn['start'], 'end': turn['end'], 'turns': [turn]})
+    
+    return [w for w in windows if w['end'] - w['start'] >= min_turn_s * 1000]
+
+def shift_segment(segment: Dict, offset_s: float) -> Dict:
+    """Whisperのセグメント（と単語）の時刻をoffset_sだけずらしたコピーを返す"""
+    words = [
+        dict(word, start=word['start'] + offset_s, end=word['end'] + offset_s)
+        for word in segment.get('words') or []
+    ]
+    return dict(segment, start=segment['start'] + offset_s, end=segment['end'] + offset_s, words=words)
+
+def compact_segment(segment: Dict) -> Dict:
+    """Whisperのセグメントからキャッシュに必要な項目だけを取り出す"""
+    segment_keys = ('start', 'end', 'text', 'avg_logprob', 'no_speech_prob', 'words')
+    return {key: segment[key] for key in segment_keys if key in segment}
+
+def compact_whisper_result(result: Dict) -> Dict:
+    """Whisperの結果からキャッシュに必要な項目だけを取り出す"""
+    return {
+        'text': result.get('text', ""),
+        'language': result.get('language'),
+        'segments': [compact_segment(segment) for segment in result.get('segments', [])]
+    }
+
+def quantize_whisper_model(model):
+    """Whisperモデルの線形層をint8の動的量子化線形層に置き換える（CPU推論用）"""
+    import torch
+    
+    # WhisperのLinearは入力の型に合わせて重みを変換するサブクラスで、
+    # quantize_dynamicは型が完全に一致する層しか置き換えないため、先に標準のLinearに差し替える
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+                linear = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None, device="meta")
+                linear.weight = child.weight
+                linear.bias = child.bias
+                setattr(module, name, linear)
+    return torch.ao.quantization.quantize_dynamic(model.float().eval(), {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+def configure_torch_threads(threads: Optional[int] = None, interop_threads: Optional[int] = None):
+    """torchの演算スレッド数（intra-op）と演算間の並列数（inter-op）を設定する"""
+    if not threads and not interop_threads:
+        return
+    import torch
+    
+    if threads:
+        torch.set_num_threads(threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            # inter-opの並列数は並列処理が始まる前にしか変更できない
+            logger.warning(f"inter-opスレッド数を設定できませんでした: {e}")
+    logger.info(f"torchのスレッド数を設定しました（intra-op: {torch.get_num_threads()}, "
+                f"inter-op: {torch.get_num_interop_threads()}）")
+
+def split_thread_budget(
+    whisper_threads: Optional[int],
+    diarize_threads: Optional[int]
+) -> Tuple[int, int]:
+    """並行実行時の文字起こし・話者分離それぞれのスレッド数を決める"""
+    cpu_count = os.cpu_count() or 2
+    if whisper_threads is None and diarize_threads is None:
+        diarize_threads = max(1, cpu_count // 2)
+    if diarize_threads is None:
+        diarize_threads = max(1, cpu_count - whisper_threads)
+    if whisper_threads is None:
+        whisper_threads = max(1, cpu_count - diarize_threads)
+    return whisper_threads, diarize_threads
+
+def run_with_thread_budget(num_threads: int, func: Callable, *args):
+    """呼び出し元スレッドのtorchの演算スレッド数を設定してから関数を実行する"""
+    import torch
+    
+    # OpenMPのスレッド数はスレッドごとの設定のため、ワーカースレッド内で設定する
+    previous = torch.get_num_threads()
+    torch.set_num_threads(num_threads)
+    try:
+        return func(*args)
+    finally:
+        torch.set_num_threads(previous)
+
+def join_texts(parts: List[str]) -> str:
+    """テキスト片を連結する（英数字同士の境界にのみ空白を入れる）"""
+    text = ""
+    for part in parts:
+        if text and part and text[-1].isascii() and text[-1].isalnum() and part[0].isascii() and part[0].isalnum():
+            text += " "
+        text += part
+    return text
+
+def format_diarized_results(results: List[Dict]) -> str:
+    """話者付きの文字起こし結果を整形する"""
+    # 結果を開始時間でソート
+    results = sorted(results, key=lambda x: x['start_s'])
+    return "\n".join(
+        f"話者 {r['speaker']} [{r['start_s']:.2f}s - {r['end_s']:.2f}s]: {r['text']}"
+        for r in results
+    )
+
+def _probe_cache_key() -> str:
+    """起動時チェックの結果を再利用できるかを判定するキー（Python環境とFFmpeg実行ファイルで決まる）"""
+    ffmpeg_path = shutil.which("ffmpeg") or ""
+    ffmpeg_stat = os.stat(ffmpeg_path) if ffmpeg_path else None
+    return ResultCache.make_key(
+        sys.executable, sys.version, ffmpeg_path,
+        ffmpeg_stat.st_size if ffmpeg_stat else 0,
+        ffmpeg_stat.st_mtime if ffmpeg_stat else 0
+    )
+
+def _load_probe_cache(cache_file: str) -> Dict:
+    """起動時チェックの結果のキャッシュを読み込む（環境が変わっていれば空を返す）"""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('key') == _probe_cache_key():
+            return data
+    except Exception:
+        pass
+    return {'key': _probe_cache_key()}
+
+def _save_probe_cache(cache_file: str, data: Dict):
+    """起動時チェックの結果を保存する"""
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+    except Exception as e:
+        logger.debug(f"起動時チェックの結果の保存に失敗しました: {e}")
+
+def check_ffmpeg(cache_file: Optional[str] = None) -> bool:
+    """FFmpegの存在を確認する（cache_fileを指定すると前回成功した結果を再利用する）"""
+    probes = _load_probe_cache(cache_file) if cache_file else {}
+    if probes.get('ffmpeg_version'):
+        logger.debug(f"FFmpeg version (キャッシュ): {probes['ffmpeg_version']}")
+        return True
+    try:
+        result = subprocess.run(["ffmpeg", "-version"], capture_output=True, check=True)
+        logger.info("FFmpegが正常に動作します")
+        # FFmpegのバージョン情報を表示
+        version_line = result.stdout.split(b'\n')[0].decode('utf-8', errors='ignore') if result.stdout else "バージョン情報なし"
+        logger.info(f"FFmpeg version: {version_line}")
+        if cache_file:
+            probes['ffmpeg_version'] = version_line
+            _save_probe_cache(cache_file, probes)
+        return True
+    except subprocess.CalledProcessError as e:
+        logger.error(f"FFmpegの実行に失敗しました: {e}")
+        return False
+    except Exception as e:
+        logger.error(f"FFmpegの確認中にエラーが発生しました: {e}")
         return False
 
+def check_dependencies(diarize: bool = True, cache_file: Optional[str] = None) -> bool:
+    """依存ライブラリの確認（インポートはせず、インストールされているかだけを調べる）"""
+    try:
+        dependencies = [
+            ("pydub", "音声ファイルの読み込みと処理"),
+            ("whisper", "音声文字起こし")
+        ]
+        if diarize:
+            dependencies.append(("pyannote.audio", "話者分離"))
+        
+        probes = _load_probe_cache(cache_file) if cache_file else {}
+        installed = set(probes.get('packages', []))
+        
+        missing = []
+        for package, purpose in dependencies:
+            if package in installed:
+                continue
+            try:
+                found = importlib.util.find_spec(package) is not None
+            except ImportError:
+                found = False
+            if found:
+                logger.info(f"{package} がインストールされています")
+                installed.add(package)
+            else:
+                missing.append(f"{package} ({purpose})")
+        
+        if cache_file:
+            probes['packages'] = sorted(installed)
+            _save_probe_cache(cache_file, probes)
+        
+        if missing:
+            logger.error(f"以下のライブラリがインストールされていません: {', '.join(missing)}")
+            logger.error("pip install whisper pyannote.audio pydub soundfile numpy コマンドを実行してください")
+            return False
+        
+        return True
+    except Exception as e:
+        logger.error(f"依存関係の確認中にエラーが発生しました: {e}")
+        return False
+
+def probe_duration(file_path: str) -> float:
+    """FFmpegが表示する情報から音声の長さ（秒）を取得する（取得できなければファイルサイズで代用）"""
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-nostdin", "-hide_banner", "-i", file_path],
+            capture_output=True
+        )
+        match = re.search(rb"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr)
+        if match:
+            hours, minutes, seconds = match.groups()
+            return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except Exception as e:
+        logger.debug(f"音声の長さの取得に失敗しました: {e}")
+    # 長さ順の並べ替えにしか使わないため、おおよその値で十分
+    return os.path.getsize(file_path) / 16000.0
+
+# 並列処理のワーカープロセスごとに保持するトランスクライバー（モデルを読み込んだまま再利用する）
+_worker_transcriber = None
+
+def _init_worker(config: Config, model_name: str, threads: int, core_sets):
+    """ワーカープロセスの初期化: スレッド数とCPUコアを割り当て、モデルを読み込んでおく"""
+    global _worker_transcriber
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[name] = str(threads)
+    if core_sets is not None and hasattr(os, "sched_setaffinity"):
+        try:
+            cores = core_sets.get_nowait()
+            os.sched_setaffinity(0, cores)
+            logger.info(f"ワーカー {os.getpid()} をコア {sorted(cores)} に割り当てました")
+        except Exception as e:
+            logger.warning(f"CPUコアの割り当てに失敗しました: {e}")
+    
+    configure_torch_threads(threads, config.interop_threads)
+    
+    _worker_transcriber = Transcriber(config)
+    _worker_transcriber._ensure_model(model_name)
+
+def _run_worker_job(job: Dict) -> Dict:
+    """ワーカープロセスで1ファイルを処理する"""
+    result = _worker_transcriber.process_file(**job)
+    result['worker'] = os.getpid()
+    result['worker_model_load_s'] = round(_worker_transcriber.model_load_seconds, 3)
+    return result
+
+def transcribe_parallel(
+    config: Config,
+    file_paths: List[str],
+    model_name: str = "base",
+    language: Optional[str] = None,
+    diarize: bool = False,
+    output_dir: str = "output",
+    workers: int = 2,
+    threads_per_worker: Optional[int] = None,
+    pin_cores: bool = False
+) -> List[Dict]:
+    """複数のワーカープロセスで並列に文字起こしする（長い音声から順に割り当てる）"""
+    cpu_count = os.cpu_count() or 1
+    workers = max(1, min(workers, len(file_paths)))
+    threads = threads_per_worker or max(1, cpu_count // workers)
+    
+    # 長い音声から先に割り当てることで、最後に長いジョブだけが残るのを防ぐ
+    durations = {path: probe_duration(path) for path in file_paths}
+    jobs = [
+        {
+            'file_path': path,
+            'model_name': model_name,
+            'language': language,
+            'diarize': diarize,
+            'output_dir': output_dir
+        }
+        for path in sorted(file_paths, key=durations.get, reverse=True)
+    ]
+    logger.info(f"{len(jobs)} ファイルを {workers} ワーカー（各 {threads} スレッド）で処理します")
+    
+    context = multiprocessing.get_context("spawn")
+    core_sets = None
+    if pin_cores:
+        core_sets = context.Queue()
+        for i in range(workers):
+            cores = {(i * threads + j) % cpu_count for j in range(threads)}
+            core_sets.put(cores)
+    
+    results = []
+    with context.Pool(
+        processes=workers,
+        initializer=_init_worker,
+        initargs=(config, model_name, threads, core_sets)
+    ) as pool:
+        for result in pool.imap_unordered(_run_worker_job, jobs, chunksize=1):
+            status = "成功" if result['success'] else f"失敗 ({result['error']})"
+            logger.info(f"'{result['file']}' の処理が終了しました: {status}, {result['elapsed_s']:.2f}秒")
+            results.append(result)
+    
+    # 入力順に並べ直して返す
+    order = {path: i for i, path in enumerate(file_paths)}
+    results.sort(key=lambda r: order.get(r['file'], len(order)))
+    for r in results:
+        r['audio_duration_s'] = round(durations.get(r['file'], 0.0), 3)
+    return results
+
+def ffmpeg_decode_command(file_path: str, start_s: float = 0.0) -> List[str]:
+    """音声を16kHzモノラルのfloat32 PCMとして標準出力に書き出すFFmpegコマンドを返す"""
+    seek = ["-ss", f"{start_s:.3f}"] if start_s > 0 else []
+    return [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-threads", "0", *seek, "-i", file_path,
+        "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-acodec", "pcm_f32le",
+        "-"
+    ]
+
+def read_stderr(stderr_file) -> str:
+    """一時ファイルに書き出されたFFmpegのエラー出力を読み出す（長大な場合は末尾のみ）"""
+    stderr_file.seek(0)
+    return stderr_file.read()[-8192:].decode('utf-8', errors='ignore').strip()
+
+def open_transcript_stream(output_file: str, append: bool = False):
+    """文字起こし結果を逐次書き込むためのファイルを開く"""
+    output_dir_for_file = os.path.dirname(output_file)
+    if output_dir_for_file:
+        os.makedirs(output_dir_for_file, exist_ok=True)
+    return open(output_file, 'a' if append else 'w', encoding='utf-8')
+
+def open_segment_writer(
+    output_file: str,
+    output_format: str = "txt",
+    append: bool = False,
+    start_index: int = 1
+) -> SegmentWriter:
+    """指定の出力形式でセグメントを逐次書き込むためのライターを開く"""
+    writer = SEGMENT_WRITERS[output_format](open_transcript_stream(output_file, append=append), start_index)
+    if not append or writer.f.tell() == 0:
+        writer.f.write(writer.header())
+    return writer
+
+def collect_input_files(paths: List[str], extensions: List[str]) -> List[str]:
+    """入力パス（ファイルまたはディレクトリ）を処理対象ファイルの一覧に展開する"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            # ディレクトリ内の対象拡張子のファイルを更新日時の古い順に追加
+            entries = [
+                os.path.join(path, name) for name in os.listdir(path)
+                if os.path.splitext(name)[1].lower() in extensions
+                and os.path.isfile(os.path.join(path, name))
+            ]
+            files.extend(sorted(entries, key=os.path.getmtime))
+        else:
+            files.append(path)
+    return files
+
+def iter_stdin_paths() -> Iterable[str]:
+    """標準入力から1行1ファイルパスを読み込む（常駐処理用）"""
+    for line in sys.stdin:
+        path = line.strip()
+        if path:
+            yield path
+
+def build_output_path(file_path: str, output_dir: str, extension: str = ".txt") -> str:
+    """入力ファイル名とタイムスタンプからデフォルトの出力ファイルパスを生成する"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    base_filename = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(output_dir, f'{base_filename}_transcript_{timestamp}{extension}')
+
+def print_batch_report(results: List[Dict], model_load_seconds: float, report_file: Optional[str] = None):
+    """複数ファイル処理の結果とタイミングを表示し、必要ならJSONで保存する"""
+    succeeded = sum(1 for r in results if r['success'])
+    total_elapsed = sum(r['elapsed_s'] for r in results)
+    print(f"処理結果: {succeeded}/{len(results)} ファイル成功 "
+          f"(合計 {total_elapsed:.2f}秒, うちモデル読み込み {model_load_seconds:.2f}秒)")
+    for r in results:
+        if r['success']:
+            skipped = f" (無音 {r['skipped_s']:.1f}秒をスキップ)" if 'skipped_s' in r else ""
+            language = f" [言語: {r['language']}]" if r.get('language') else ""
+            plan = r.get('segment_plan')
+            calls = f" (話者区間 {plan['turns']} 件を {plan['calls']} 回で文字起こし)" if plan else ""
+            print(f"  成功 {r['elapsed_s']:8.2f}秒  {r['file']} -> {r['output_file']}{language}{skipped}{calls}")
+        else:
+            print(f"  失敗 {r['elapsed_s']:8.2f}秒  {r['file']} ({r['error']})")
+    
+    if report_file:
+        try:
+            report = {
+                'model_load_s': round(model_load_seconds, 3),
+                'total_elapsed_s': round(total_elapsed, 3),
+                'files': results
+            }
+            with open(report_file, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            logger.info(f"処理レポートが {report_file} に保存されました")
+        except Exception as e:
+            logger.error(f"処理レポートの保存に失敗しました: {e}")
+
 def save_transcription(text: str, output_file: str, output_dir: str) -> bool:
     """文字起こし結果をファイルに保存する"""
     try:
@@ -410,7 +2677,12 @@ def main():
     config = Config()
     
     parser = argparse.ArgumentParser(description='Whisperを使用した音声文字起こしツール (m4a対応版)')
-    parser.add_argument('file', type=str, help='文字起こしする音声ファイルのパス')
+    parser.add_argument(
+        'file',
+        type=str,
+        nargs='*',
+        help='文字起こしする音声ファイルまたはディレクトリのパス（複数指定可）'
+    )
     parser.add_argument(
         '--model',
         type=str,
@@ -429,11 +2701,158 @@ def main():
         action='store_true',
         help='話者分離を有効にする (ローカルの話者分離モデルが必要です)'
     )
+    parser.add_argument(
+        '--diarize_mode',
+        type=str,
+        default=config.diarize_mode,
+        choices=config.diarize_modes,
+        help='話者分離時の文字起こし方式。overlap: 全体を1回で文字起こしし時刻の重なりで話者を割り当てる, '
+             f'segment: 話者区間ごとに文字起こしする (デフォルト: {config.diarize_mode})'
+    )
+    parser.add_argument(
+        '--word_timestamps',
+        action='store_true',
+        help='overlap方式で単語単位のタイムスタンプを使って話者を割り当てる'
+    )
+    parser.add_argument(
+        '--batch_size',
+        type=int,
+        default=config.batch_size,
+        help=f'segment方式で1度にデコードする区間数。1以下で1区間ずつ処理する (デフォルト: {config.batch_size})'
+    )
+    parser.add_argument(
+        '--pack_seconds',
+        type=float,
+        default=config.pack_seconds,
+        help=f'segment方式で短い話者区間をまとめて文字起こしする窓の最大長（秒）。0でまとめない (デフォルト: {config.pack_seconds})'
+    )
+    parser.add_argument(
+        '--parallel_diarization',
+        action='store_true',
+        help='overlap方式で話者分離と文字起こしを並行して実行する'
+    )
+    parser.add_argument(
+        '--whisper_threads',
+        type=int,
+        default=None,
+        help='並行実行時に文字起こしが使うスレッド数 (デフォルト: コア数を等分)'
+    )
+    parser.add_argument(
+        '--diarize_threads',
+        type=int,
+        default=None,
+        help='並行実行時に話者分離が使うスレッド数 (デフォルト: コア数を等分)'
+    )
+    parser.add_argument(
+        '--no_cache',
+        action='store_true',
+        help='文字起こし・話者分離結果のキャッシュを使用しない'
+    )
+    parser.add_argument(
+        '--clear_cache',
+        action='store_true',
+        help='処理の前にキャッシュをすべて削除する（入力ファイル未指定の場合は削除のみ行う）'
+    )
+    parser.add_argument(
+        '--cache_max_mb',
+        type=float,
+        default=config.cache_max_mb,
+        help=f'キャッシュの最大サイズ（MB）。超えた分は最終利用日時の古い順に削除 (デフォルト: {config.cache_max_mb})'
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='長時間音声向けに窓ごとにデコード・文字起こしし、確定した結果を順次ファイルに書き出す（話者分離は無効）'
+    )
+    parser.add_argument(
+        '--chunk_seconds',
+        type=float,
+        default=config.chunk_seconds,
+        help=f'ストリーミング時の窓の長さ（秒） (デフォルト: {config.chunk_seconds})'
+    )
+    parser.add_argument(
+        '--no_checkpoint',
+        action='store_true',
+        help='中断後に再開するためのチェックポイントを作成しない'
+    )
+    parser.add_argument(
+        '--checkpoint_interval',
+        type=float,
+        default=config.checkpoint_interval,
+        help=f'チェックポイントを書き込む最小間隔（秒） (デフォルト: {config.checkpoint_interval})'
+    )
+    parser.add_argument(
+        '--vad',
+        action='store_true',
+        help='エネルギーベースの音声区間検出で無音を除いてから文字起こし・話者分離を行う'
+    )
+    parser.add_argument(
+        '--vad_threshold_db',
+        type=float,
+        default=config.vad_threshold_db,
+        help=f'発話とみなす最小のフレームエネルギー（dBFS） (デフォルト: {config.vad_threshold_db})'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='複数ファイルを並列に処理するワーカープロセス数 (デフォルト: 1)'
+    )
+    parser.add_argument(
+        '--threads_per_worker',
+        type=int,
+        default=None,
+        help='ワーカーごとの演算スレッド数 (デフォルト: コア数をワーカー数で等分)'
+    )
+    parser.add_argument(
+        '--pin_cores',
+        action='store_true',
+        help='ワーカーごとに別々のCPUコアを割り当てる（Linuxのみ）'
+    )
+    parser.add_argument(
+        '--speaker_index',
+        action='store_true',
+        help=f'話者埋め込みの索引（{config.speaker_index_dir}）でファイルをまたいで話者を同定し、SPEAKER_00 などの代わりに共通の話者IDで出力する'
+    )
+    parser.add_argument(
+        '--speaker_threshold',
+        type=float,
+        default=config.speaker_threshold,
+        help=f'既知の話者と同一人物とみなすコサイン類似度の下限 (デフォルト: {config.speaker_threshold})'
+    )
+    parser.add_argument(
+        '--quantize',
+        action='store_true',
+        help=f'Whisperの線形層をint8に動的量子化してCPUで推論する（量子化済みモデルは {config.quantized_dir} に保存され再利用される）'
+    )
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=None,
+        help='torchの演算スレッド数（intra-op）。並列処理時は --threads_per_worker が使われる'
+    )
+    parser.add_argument(
+        '--interop_threads',
+        type=int,
+        default=None,
+        help='torchの演算間の並列数（inter-op）'
+    )
+    parser.add_argument(
+        '--output_format',
+        choices=config.output_formats,
+        default=config.output_format,
+        help='出力形式。txt以外（jsonl/srt/vtt）は開始・終了時刻・話者・信頼度付きのセグメントを確定した順に追記する (デフォルト: txt)'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='処理段階ごとの経過時間・CPU時間・最大メモリ量・処理速度を出力ファイルの隣にJSONで保存する'
+    )
     parser.add_argument(
         '--output_file',
         type=str,
         default=None,
-        help='結果を保存するファイルパス。指定しない場合はoutput_dirに保存。'
+        help='結果を保存するファイルパス。指定しない場合はoutput_dirに保存。入力が1ファイルの場合のみ有効。'
     )
     parser.add_argument(
         '--output_dir',
@@ -441,6 +2860,17 @@ def main():
         default=config.output_dir,
         help=f'出力ディレクトリ (デフォルト: {config.output_dir}/)'
     )
+    parser.add_argument(
+        '--stdin',
+        action='store_true',
+        help='標準入力から1行1ファイルパスを読み込み、モデルを読み込んだまま順に処理する（常駐モード）'
+    )
+    parser.add_argument(
+        '--report_file',
+        type=str,
+        default=None,
+        help='ファイルごとの処理結果とタイミングをJSONで保存するパス'
+    )
     parser.add_argument(
         '--debug',
         action='store_true',
@@ -454,58 +2884,127 @@ def main():
         logger.setLevel(logging.DEBUG)
         logger.debug("デバッグモードが有効です")
     
-    # ファイルの存在確認
-    if not os.path.exists(args.file):
-        logger.error(f"ファイル '{args.file}' が見つかりません")
+    config.diarize_mode = args.diarize_mode
+    config.word_timestamps = args.word_timestamps
+    config.batch_size = args.batch_size
+    config.pack_seconds = args.pack_seconds
+    config.parallel_diarization = args.parallel_diarization
+    config.whisper_threads = args.whisper_threads
+    config.diarize_threads = args.diarize_threads
+    config.use_cache = not args.no_cache
+    config.cache_max_mb = args.cache_max_mb
+    config.stream = args.stream
+    config.chunk_seconds = args.chunk_seconds
+    config.use_checkpoint = not args.no_checkpoint
+    config.checkpoint_interval = args.checkpoint_interval
+    config.vad = args.vad
+    config.vad_threshold_db = args.vad_threshold_db
+    config.profile = args.profile
+    config.output_format = args.output_format
+    config.quantize = args.quantize
+    config.speaker_index = args.speaker_index
+    config.speaker_threshold = args.speaker_threshold
+    config.threads = args.threads
+    config.interop_threads = args.interop_threads
+    if args.stream and args.diarize:
+        logger.warning("ストリーミングモードでは話者分離は使用できないため、--diarize は無視されます")
+        args.diarize = False
+    
+    if args.clear_cache:
+        ResultCache(config.cache_dir, config.cache_max_mb).clear()
+        if not args.file and not args.stdin:
+            return
+    
+    if not args.file and not args.stdin:
+        parser.error("音声ファイルまたはディレクトリを指定するか、--stdin を指定してください")
+    
+    # 入力ファイルの展開と存在確認
+    input_files = collect_input_files(args.file, config.audio_extensions)
+    for file_path in input_files:
+        if not os.path.exists(file_path):
+            logger.error(f"ファイル '{file_path}' が見つかりません")
+            sys.exit(1)
+    if args.file and not input_files:
+        logger.error("処理対象の音声ファイルが見つかりません")
         sys.exit(1)
     
-    # 依存関係の確認
-    if not check_dependencies():
+    if args.output_file and (args.stdin or len(input_files) > 1):
+        logger.warning("複数ファイルを処理するため --output_file は無視され、output_dir に保存されます")
+        args.output_file = None
+    
+    # 依存関係の確認（話者分離を使わない場合はpyannote.audioを確認しない）
+    if not check_dependencies(diarize=args.diarize, cache_file=config.probe_cache_file):
         logger.error("必要な依存関係が満たされていません")
         sys.exit(1)
     
     # FFmpegの確認
-    if not check_ffmpeg():
+    if not check_ffmpeg(cache_file=config.probe_cache_file):
         logger.error("FFmpegが利用できません。インストールまたはパスの設定を確認してください。")
         sys.exit(1)
     
+    # 並列処理時はワーカーごとにスレッド数を設定する
+    if not (args.workers > 1 and len(input_files) > 1 and not args.stdin):
+        configure_torch_threads(config.threads, config.interop_threads)
+    elif config.threads:
+        logger.warning("並列処理では --threads の代わりに --threads_per_worker が使われます")
+    
     # トランスクライバーの作成
     transcriber = Transcriber(config)
     
-    # 文字起こしの実行
-    transcription_text = transcriber.transcribe_audio(
-        file_path=args.file,
+    # 単一ファイルの場合は従来通りの動作
+    if len(input_files) == 1 and not args.stdin:
+        if args.workers > 1:
+            logger.info("入力が1ファイルのため、並列処理は行いません")
+        result = transcriber.process_file(
+            file_path=input_files[0],
+            model_name=args.model,
+            language=args.language,
+            diarize=args.diarize,
+            output_file=args.output_file,
+            output_dir=args.output_dir
+        )
+        if args.report_file:
+            print_batch_report([result], transcriber.model_load_seconds, args.report_file)
+        if result['success']:
+            logger.info(f"文字起こし結果が {result['output_file']} に保存されました")
+            print(f"文字起こし結果が {result['output_file']} に保存されました")
+        elif not result['transcribed']:
+            print("エラー: 文字起こし結果が空です。ログを確認してください。")
+            sys.exit(1)
+        return
+    
+    # 複数のワーカープロセスで並列に処理する
+    if args.workers > 1 and not args.stdin:
+        results = transcribe_parallel(
+            config,
+            input_files,
+            model_name=args.model,
+            language=args.language,
+            diarize=args.diarize,
+            output_dir=args.output_dir,
+            workers=args.workers,
+            threads_per_worker=args.threads_per_worker,
+            pin_cores=args.pin_cores
+        )
+        model_load_seconds = sum({r['worker']: r['worker_model_load_s'] for r in results if 'worker' in r}.values())
+        print_batch_report(results, model_load_seconds, args.report_file)
+        if not all(r['success'] for r in results):
+            sys.exit(1)
+        return
+    if args.workers > 1:
+        logger.warning("--stdin では並列処理は使用できないため、1ファイルずつ処理します")
+    
+    # 複数ファイル・常駐モードではモデルを一度だけ読み込んで使い回す
+    paths = iter_stdin_paths() if args.stdin else input_files
+    results = transcriber.transcribe_batch(
+        paths,
         model_name=args.model,
         language=args.language,
-        diarize=args.diarize
+        diarize=args.diarize,
+        output_dir=args.output_dir
     )
-    
-    # 結果の処理
-    if transcription_text:
-        if args.output_file:
-            # 指定されたファイルに保存
-            if save_transcription(transcription_text, args.output_file, args.output_dir):
-                logger.info(f"文字起こし結果が {args.output_file} に保存されました")
-                print(f"文字起こし結果が {args.output_file} に保存されました")
-            else:
-                # 保存に失敗した場合は標準出力に表示
-                print("文字起こし結果:")
-                print(transcription_text)
-        else:
-            # デフォルトのファイル名で保存
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            base_filename = os.path.splitext(os.path.basename(args.file))[0]
-            output_file = os.path.join(args.output_dir, f'{base_filename}_transcript_{timestamp}.txt')
-            if save_transcription(transcription_text, output_file, args.output_dir):
-                logger.info(f"文字起こし結果が {output_file} に保存されました")
-                print(f"文字起こし結果が {output_file} に保存されました")
-            else:
-                # 保存に失敗した場合は標準出力に表示
-                print("文字起こし結果:")
-                print(transcription_text)
-    else:
-        logger.error("文字起こし結果が空です")
-        print("エラー: 文字起こし結果が空です。ログを確認してください。")
+    print_batch_report(results, transcriber.model_load_seconds, args.report_file)
+    if not all(r['success'] for r in results):
         sys.exit(1)
 
 if __name__ == "__main__":
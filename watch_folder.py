@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+フォルダを監視して音声ファイルを文字起こしする常駐サービス (powershell/transcribeScript.ps1 の置き換え)
+
+入力フォルダに置かれたファイルを書き込み完了まで待ってから処理中フォルダへ移動し、
+モデルを読み込んだままの Transcriber で文字起こしして、成功したファイルを完了フォルダへ移動する。
+"""
+
+import argparse
+import os
+import sys
+import time
+import json
+import queue
+import shutil
+import logging
+import threading
+import importlib.util
+from datetime import datetime
+from typing import List, Dict, Optional
+
+from transcribe import (
+    Config, Transcriber, setup_encoding, check_dependencies, check_ffmpeg, open_transcript_stream
+)
+
+logger = logging.getLogger("watch_folder")
+
+class JobQueue:
+    """ジョブの状態をJSONファイルに保存し、再起動後も処理を引き継げるようにするキュー"""
+    
+    # 完了・失敗したジョブを履歴として残す件数
+    max_history = 1000
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.jobs = []
+        self.lock = threading.Lock()
+        self._load()
+    
+    def _load(self):
+        """保存済みのジョブを読み込む（処理中のまま終了したジョブは待機中に戻す）"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.jobs = json.load(f).get('jobs', [])
+        except Exception as e:
+            logger.warning(f"ジョブキュー {self.path} の読み込みに失敗しました: {e}")
+            return
+        interrupted = [job for job in self.jobs if job['state'] == "transcribing"]
+        for job in interrupted:
+            job['state'] = "queued"
+        if interrupted:
+            logger.info(f"前回処理中だった {len(interrupted)} 件のジョブを再開します")
+            self.save()
+    
+    def save(self):
+        """ジョブの状態を保存する（書き込み途中で終了しても壊れないよう一時ファイルから置き換える）"""
+        finished = [job for job in self.jobs if job['state'] in ("done", "failed")]
+        if len(finished) > self.max_history:
+            drop = {id(job) for job in finished[:len(finished) - self.max_history]}
+            self.jobs = [job for job in self.jobs if id(job) not in drop]
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'jobs': self.jobs}, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.path)
+    
+    def add(self, path: str, source: str) -> Dict:
+        """待機中のジョブを追加する"""
+        with self.lock:
+            now = datetime.now().isoformat(timespec='seconds')
+            job = {
+                'name': os.path.basename(path),
+                'source': source,
+                'path': path,
+                'state': "queued",
+                'attempts': 0,
+                'enqueued_at': now,
+                'updated_at': now,
+                'output_file': None,
+                'error': None
+            }
+            self.jobs.append(job)
+            self.save()
+            return job
+    
+    def update(self, job: Dict, **values):
+        """ジョブの状態を更新して保存する"""
+        with self.lock:
+            job.update(values, updated_at=datetime.now().isoformat(timespec='seconds'))
+            self.save()
+    
+    def next_job(self) -> Optional[Dict]:
+        """最も古い待機中のジョブを返す"""
+        with self.lock:
+            return next((job for job in self.jobs if job['state'] == "queued"), None)
+    
+    def known_paths(self) -> set:
+        """完了以外のジョブが対象としているファイルのパス"""
+        with self.lock:
+            return {os.path.abspath(job['path']) for job in self.jobs if job['state'] != "done"}
+    
+    def retry_failed(self) -> int:
+        """失敗したジョブを待機中に戻す"""
+        with self.lock:
+            failed = [job for job in self.jobs if job['state'] == "failed"]
+            for job in failed:
+                job['state'] = "queued"
+            if failed:
+                self.save()
+            return len(failed)
+
+class StabilityTracker:
+    """ファイルの大きさと更新日時が一定時間変わらなくなるまで待ち、書き込み完了を判定するクラス"""
+    
+    def __init__(self, stable_seconds: float):
+        self.stable_seconds = stable_seconds
+        self.pending = {}  # パス -> (大きさ, 更新日時, 変化がなくなった時刻)
+    
+    def add(self, path: str):
+        """監視対象のファイルを追加する（既に監視中なら変化の確認を続ける）"""
+        self.pending.setdefault(path, None)
+    
+    def pop_ready(self) -> List[str]:
+        """書き込みが完了したと判定できたファイルを監視対象から外して返す"""
+        ready = []
+        now = time.monotonic()
+        for path, previous in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # 削除・移動されたファイルは監視をやめる
+                del self.pending[path]
+                continue
+            signature = (stat.st_size, stat.st_mtime)
+            if previous is None or previous[:2] != signature:
+                self.pending[path] = (*signature, now)
+            elif now - previous[2] >= self.stable_seconds and is_readable(path):
+                del self.pending[path]
+                ready.append(path)
+        return ready
+
+def is_readable(path: str) -> bool:
+    """ファイルを開けるかを確認する（Windowsでは書き込み中のファイルは開けない場合がある）"""
+    try:
+        with open(path, 'rb'):
+            return True
+    except OSError:
+        return False
+
+def unique_path(directory: str, name: str) -> str:
+    """移動先に同名のファイルがあれば番号を付けたパスを返す"""
+    path = os.path.join(directory, name)
+    base, extension = os.path.splitext(name)
+    index = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f"{base}_{index}{extension}")
+        index += 1
+    return path
+
+def list_audio_files(directory: str, extensions: List[str], timestamp: str = "mtime") -> List[str]:
+    """フォルダ内の対象拡張子のファイルを古い順に返す"""
+    files = [
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if os.path.splitext(name)[1].lower() in extensions and os.path.isfile(os.path.join(directory, name))
+    ]
+    key = os.path.getctime if timestamp == "ctime" else os.path.getmtime
+    return sorted(files, key=key)
+
+def start_observer(directory: str, events: "queue.Queue[str]"):
+    """watchdogでフォルダの変更通知を受け取る（未インストールならNoneを返し、ポーリングで監視する）"""
+    if importlib.util.find_spec("watchdog") is None:
+        return None
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    
+    class Handler(FileSystemEventHandler):
+        def on_created(self, event):
+            if not event.is_directory:
+                events.put(event.src_path)
+        
+        def on_modified(self, event):
+            if not event.is_directory:
+                events.put(event.src_path)
+        
+        def on_moved(self, event):
+            if not event.is_directory:
+                events.put(event.dest_path)
+    
+    observer = Observer()
+    observer.schedule(Handler(), directory, recursive=False)
+    observer.start()
+    return observer
+
+class FolderWatcher:
+    """入力・処理中・完了の3つのフォルダでファイルを受け渡しながら文字起こしを行う常駐サービス"""
+    
+    def __init__(self, args, config: Config):
+        self.args = args
+        self.config = config
+        self.jobs = JobQueue(args.queue_file)
+        self.tracker = StabilityTracker(args.stable_seconds)
+        self.events = queue.Queue()
+        self.transcriber = Transcriber(config)
+        self.observer = None
+    
+    def run(self):
+        """監視を開始し、停止されるまで（--onceの場合は入力フォルダが空になるまで）処理を続ける"""
+        for directory in (self.args.input_dir, self.args.transcribing_dir, self.args.end_dir, self.args.output_dir):
+            os.makedirs(directory, exist_ok=True)
+        if self.args.retry_failed:
+            logger.info(f"失敗した {self.jobs.retry_failed()} 件のジョブを再試行します")
+        self._adopt_transcribing_files()
+        
+        # 通知を受ける前からあるファイルも対象にする
+        for path in list_audio_files(self.args.input_dir, self.config.audio_extensions, self.args.timestamp):
+            self.tracker.add(path)
+        if not self.args.once:
+            self.observer = start_observer(self.args.input_dir, self.events)
+            if self.observer:
+                logger.info(f"フォルダ {self.args.input_dir} の変更通知による監視を開始します")
+            else:
+                logger.warning(f"watchdogがインストールされていないため、{self.args.poll_interval}秒ごとのポーリングで"
+                               f"フォルダ {self.args.input_dir} を監視します（pip install watchdog で変更通知を使用できます）")
+        
+        # モデルは最初に一度だけ読み込み、以降のファイルで使い回す
+        if not self.transcriber._ensure_model(self.args.model):
+            return 1
+        try:
+            while True:
+                self._collect_ready_files()
+                job = self.jobs.next_job()
+                if job:
+                    self._process(job)
+                    continue
+                if self.args.once and not self.tracker.pending:
+                    break
+                self._wait_for_events()
+        except KeyboardInterrupt:
+            logger.info("監視を停止します")
+        finally:
+            if self.observer:
+                self.observer.stop()
+                self.observer.join()
+        return 0
+    
+    def _adopt_transcribing_files(self):
+        """処理中フォルダに残っていてキューにないファイル（以前のスクリプトで中断したものなど）を追加する"""
+        known = self.jobs.known_paths()
+        for path in list_audio_files(self.args.transcribing_dir, self.config.audio_extensions, self.args.timestamp):
+            if os.path.abspath(path) not in known:
+                logger.info(f"処理中フォルダに残っていた {path} をキューに追加します")
+                self.jobs.add(path, source=path)
+    
+    def _wait_for_events(self):
+        """変更通知を待つ（書き込み完了待ちのファイルがあれば短い間隔で確認する）"""
+        timeout = min(self.args.poll_interval, self.args.stable_seconds) if self.tracker.pending else self.args.poll_interval
+        try:
+            self._track(self.events.get(timeout=timeout))
+        except queue.Empty:
+            if not self.observer:
+                for path in list_audio_files(self.args.input_dir, self.config.audio_extensions, self.args.timestamp):
+                    self.tracker.add(path)
+    
+    def _track(self, path: str):
+        """通知されたファイルが入力フォルダ直下にあれば書き込み完了の監視対象にする"""
+        # 処理中フォルダへの移動も通知されるため、移動先のパスは無視する
+        if os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.args.input_dir):
+            self.tracker.add(path)
+    
+    def _collect_ready_files(self):
+        """書き込みが完了したファイルを処理中フォルダへ移動してキューに追加する"""
+        while True:
+            try:
+                self._track(self.events.get_nowait())
+            except queue.Empty:
+                break
+        for path in self.tracker.pop_ready():
+            if os.path.splitext(path)[1].lower() not in self.config.audio_extensions:
+                logger.info(f"スキップ (拡張子が対象外): {os.path.basename(path)}")
+                continue
+            destination = unique_path(self.args.transcribing_dir, os.path.basename(path))
+            try:
+                shutil.move(path, destination)
+            except OSError as e:
+                logger.warning(f"{path} を処理中フォルダへ移動できませんでした: {e}")
+                continue
+            logger.info(f"{os.path.basename(path)} を処理中フォルダへ移動し、キューに追加しました")
+            self.jobs.add(destination, source=path)
+    
+    def _process(self, job: Dict):
+        """1件のジョブを文字起こしし、成功したファイルを完了フォルダへ移動する"""
+        if not os.path.exists(job['path']):
+            logger.warning(f"{job['path']} が見つからないため、ジョブを失敗として記録します")
+            self.jobs.update(job, state="failed", error="ファイルが見つかりません")
+            return
+        
+        self.jobs.update(job, state="transcribing", attempts=job['attempts'] + 1)
+        log_handler = self._open_job_log()
+        try:
+            logger.info(f"{job['name']} の文字起こしを開始します...")
+            result = self.transcriber.process_file(
+                file_path=job['path'],
+                model_name=self.args.model,
+                language=self.args.language,
+                diarize=self.args.diarize,
+                output_dir=self.args.output_dir
+            )
+        finally:
+            if log_handler:
+                logging.getLogger().removeHandler(log_handler)
+                log_handler.close()
+        
+        if not result['success']:
+            # 失敗したファイルは以前のスクリプトと同じく処理中フォルダに残す
+            logger.warning(f"{job['name']} の文字起こしに失敗しました: {result['error']}")
+            self.jobs.update(job, state="failed", error=result['error'])
+            return
+        try:
+            end_path = unique_path(self.args.end_dir, os.path.basename(job['path']))
+            shutil.move(job['path'], end_path)
+            logger.info(f"処理完了ファイルを移動しました: {end_path}（{result['elapsed_s']:.1f}秒）")
+        except OSError as e:
+            logger.warning(f"ファイルの移動中にエラーが発生しました: {e}")
+            end_path = job['path']
+        self.jobs.update(job, state="done", path=end_path, output_file=result['output_file'], error=None)
+    
+    def _open_job_log(self) -> Optional[logging.Handler]:
+        """ファイルごとのログを記録するハンドラを追加する（--log_dir指定時のみ）"""
+        if not self.args.log_dir:
+            return None
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        log_file = os.path.join(self.args.log_dir, f"transcribe_log_{timestamp}.txt")
+        handler = logging.StreamHandler(open_transcript_stream(log_file, append=True))
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        logging.getLogger().addHandler(handler)
+        return handler
+
+def main():
+    """メイン関数"""
+    setup_encoding()
+    config = Config()
+    
+    parser = argparse.ArgumentParser(description='フォルダを監視して音声ファイルを文字起こしする')
+    parser.add_argument('--input_dir', type=str, default="./TranscribeInput", help='新しい音声ファイルを置くフォルダ')
+    parser.add_argument('--transcribing_dir', type=str, default="./Transcribing", help='処理中のファイルを移動するフォルダ')
+    parser.add_argument('--end_dir', type=str, default="./TranscribeEnd", help='処理が完了したファイルを移動するフォルダ')
+    parser.add_argument('--output_dir', type=str, default="./TranscribeOutput", help='文字起こし結果の保存先')
+    parser.add_argument('--log_dir', type=str, default=None, help='ファイルごとのログの保存先（省略時は保存しない）')
+    parser.add_argument('--model', type=str, default=config.default_model, choices=config.get_available_models())
+    parser.add_argument('--language', type=str, default="ja")
+    parser.add_argument('--diarize', action='store_true', help='話者分離を行う')
+    parser.add_argument('--diarize_mode', choices=config.diarize_modes, default=config.diarize_mode)
+    parser.add_argument('--output_format', choices=config.output_formats, default=config.output_format)
+    parser.add_argument('--queue_file', type=str, default="./tmp/watch_queue.json", help='ジョブキューの保存先')
+    parser.add_argument('--stable_seconds', type=float, default=3.0, help='大きさと更新日時がこの秒数変わらなければ書き込み完了とみなす')
+    parser.add_argument('--poll_interval', type=float, default=5.0, help='ポーリング・待機の間隔（秒）')
+    parser.add_argument(
+        '--timestamp',
+        choices=['mtime', 'ctime'],
+        default='mtime',
+        help='起動時に既にあるファイルを処理する順序に使う日時（mtime: 最終更新日時, ctime: 作成日時）'
+    )
+    parser.add_argument('--retry_failed', action='store_true', help='前回失敗したジョブを再試行する')
+    parser.add_argument('--once', action='store_true', help='監視せず、入力フォルダにあるファイルを処理したら終了する')
+    args = parser.parse_args()
+    
+    config.diarize_mode = args.diarize_mode
+    config.output_format = args.output_format
+    
+    if not check_dependencies(diarize=args.diarize, cache_file=config.probe_cache_file):
+        logger.error("必要な依存関係が満たされていません")
+        sys.exit(1)
+    if not check_ffmpeg(cache_file=config.probe_cache_file):
+        logger.error("FFmpegが利用できません。インストールまたはパスの設定を確認してください。")
+        sys.exit(1)
+    
+    sys.exit(FolderWatcher(args, config).run())
+
+if __name__ == "__main__":
+    main()